@@ -39,7 +39,7 @@ class QuaternionPacket(_XYZPacket):
         partial_packet = struct.pack(
             self._FMT_CONSTRUCT, self._TYPE_HEADER, self._x, self._y, self._z, self._w
         )
-        return partial_packet + self.checksum(partial_packet)
+        return self.add_checksum(partial_packet)
 
     @property
     def w(self):
@@ -31,7 +31,8 @@ Implementation Notes
 __version__ = "0.0.0-auto.0"
 __repo__ = "https://github.com/adafruit/Adafruit_CircuitPython_ICM20X.git"
 # Common imports; remove if unused or pylint will complain
-from time import sleep
+from time import sleep, monotonic_ns
+from struct import unpack_from
 from adafruit_bus_device import i2c_device
 
 from adafruit_register.i2c_struct import UnaryStruct, ROUnaryStruct, Struct
@@ -49,8 +50,10 @@ _ICM20948_DEVICE_ID = 0xEA  # Correct content of WHO_AM_I register
 _ICM20X_WHO_AM_I = 0x00  # device_id register
 _ICM20X_REG_BANK_SEL = 0x7F  # register bank selection register
 _ICM20X_PWR_MGMT_1 = 0x06  # primary power management register
+_ICM20X_PWR_MGMT_2 = 0x07  # per sensor enables
 _ICM20X_ACCEL_XOUT_H = 0x2D  # first byte of accel data
 _ICM20X_GYRO_XOUT_H = 0x33  # first byte of accel data
+_ICM20X_TEMP_OUT_H = 0x39  # first byte of temperature data
 _ICM20X_I2C_MST_STATUS = 0x17  # I2C Microcontroller Status bits
 _ICM20948_EXT_SLV_SENS_DATA_00 = 0x3B
 
@@ -59,13 +62,24 @@ _ICM20X_LP_CONFIG = 0x05  # Low Power config
 _ICM20X_REG_INT_PIN_CFG = 0xF  # Interrupt config register
 _ICM20X_REG_INT_ENABLE_0 = 0x10  # Interrupt enable register 0
 _ICM20X_REG_INT_ENABLE_1 = 0x11  # Interrupt enable register 1
+_ICM20X_REG_INT_ENABLE_3 = 0x13  # Interrupt enable register 3
+_ICM20X_INT_STATUS = 0x19  # first of the four interrupt status registers
+_ICM20X_FIFO_EN_2 = 0x67  # Sensor data written to the FIFO
+_ICM20X_FIFO_RST = 0x68  # FIFO reset
+_ICM20X_FIFO_MODE = 0x69  # FIFO stream or snapshot mode
+_ICM20X_FIFO_COUNTH = 0x70  # first byte of the FIFO byte count
+_ICM20X_FIFO_R_W = 0x72  # FIFO read/write port
 
 # Bank 2
 _ICM20X_GYRO_SMPLRT_DIV = 0x00
 _ICM20X_GYRO_CONFIG_1 = 0x01
+_ICM20X_XG_OFFS_USRH = 0x03  # first of the x, y, z big-endian gyro offsets
 _ICM20X_ACCEL_SMPLRT_DIV_1 = 0x10
 _ICM20X_ACCEL_SMPLRT_DIV_2 = 0x11
+_ICM20X_ACCEL_INTEL_CTRL = 0x12  # Wake on motion logic control
+_ICM20X_ACCEL_WOM_THR = 0x13  # Wake on motion threshold
 _ICM20X_ACCEL_CONFIG_1 = 0x14
+_ICM20X_BANK_2_SHADOW_SIZE = 0x16  # GYRO_SMPLRT_DIV through ACCEL_CONFIG_2
 
 
 # Bank 3
@@ -77,6 +91,7 @@ _ICM20X_I2C_SLV0_ADDR = 0x3  # Sets I2C address for I2C microcontroller bus sens
 _ICM20X_I2C_SLV0_REG = 0x4  # Sets register address for I2C microcontroller bus sensor 0
 _ICM20X_I2C_SLV0_CTRL = 0x5  # Controls for I2C microcontroller bus sensor 0
 _ICM20X_I2C_SLV0_DO = 0x6  # Sets I2C microcontroller bus sensor 0 data out
+_ICM20X_BANK_3_SHADOW_SIZE = 0x7  # I2C_MST_ODR_CONFIG through I2C_SLV0_DO
 
 _ICM20X_I2C_SLV4_ADDR = 0x13  # Sets I2C address for I2C microcontroller bus sensor 4
 _ICM20X_I2C_SLV4_REG = (
@@ -88,9 +103,46 @@ _ICM20X_I2C_SLV4_DI = 0x17  # Sets I2C microcontroller bus sensor 4 data in
 
 _ICM20X_UT_PER_LSB = 0.15  # mag data LSB value (fixed)
 _ICM20X_RAD_PER_DEG = 0.017453293  # Degrees/s to rad/s multiplier
+_ICM20X_TEMP_LSB_PER_DEG_C = 333.87  # temperature sensitivity
+_ICM20X_TEMP_OFFSET = 21.0  # degrees C at a raw reading of 0
+_ICM20X_FIFO_SIZE = 512  # bytes
+_ICM20X_WOM_MG_PER_LSB = 4  # wake on motion threshold resolution
+_ICM20X_MAX_SHADOW_GAP = 2  # clean registers worth rewriting to merge two dirty runs
 
 G_TO_ACCEL = 9.80665
 
+# Time (in seconds) a register write needs before the next access that depends on it.
+# Plain data reads only wait if one of these is still pending.
+_ICM20X_RESET_SETTLE = 0.011  # register access after a soft reset
+_ICM20X_WAKE_SETTLE = 0.035  # gyro start-up time after leaving sleep
+_ICM20X_RANGE_SETTLE = 0.100  # new full-scale range reaching the data registers
+_ICM20X_I2C_MASTER_SETTLE = 0.020  # I2C master ready after being enabled
+_ICM20X_POLL_INTERVAL = 0.001
+# SLV4 transactions run once per gyro sample, give them a few samples before giving up
+_AK09916_TRANSACTION_SAMPLES = 3
+
+
+def _be_int16(high, low):
+    value = high << 8 | low
+    return value - 0x10000 if value & 0x8000 else value
+
+
+class _ConfigurationBatch:
+    """Defers shadowed configuration writes until the outermost batch exits"""
+
+    def __init__(self, sensor):
+        self._sensor = sensor
+
+    def __enter__(self):
+        self._sensor._batch_depth += 1  # pylint: disable=protected-access
+        return self._sensor
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._sensor._batch_depth -= 1  # pylint: disable=protected-access
+        if not self._sensor._batch_depth:  # pylint: disable=protected-access
+            self._sensor.commit()
+        return False
+
 
 class CV:
     """struct helper"""
@@ -143,6 +195,9 @@ class ICM20X:  # pylint:disable=too-many-instance-attributes
 
     :param ~busio.I2C i2c_bus: The I2C bus the ICM20X is connected to.
     :param int address: The I2C address of the device.
+    :param bool warm_start: Skip the reset and configuration if the sensor is already running
+        with the default configuration, e.g. after a watchdog reset or waking from deep sleep.
+        :attr:`warm_started` tells whether it was skipped.
 
     """
 
@@ -153,28 +208,38 @@ class ICM20X:  # pylint:disable=too-many-instance-attributes
     _sleep_reg = RWBit(_ICM20X_PWR_MGMT_1, 6)
     _low_power_en = RWBit(_ICM20X_PWR_MGMT_1, 5)
     _clock_source = RWBits(3, _ICM20X_PWR_MGMT_1, 0)
+    _gyro_disable = RWBits(3, _ICM20X_PWR_MGMT_2, 0)
 
     _raw_accel_data = Struct(_ICM20X_ACCEL_XOUT_H, ">hhh")  # ds says LE :|
     _raw_gyro_data = Struct(_ICM20X_GYRO_XOUT_H, ">hhh")
+    _raw_temp_data = ROUnaryStruct(_ICM20X_TEMP_OUT_H, ">h")
+
+    # accel, gyro and temperature data are contiguous from ACCEL_XOUT_H
+    _burst_length = 14
 
     _lp_config_reg = UnaryStruct(_ICM20X_LP_CONFIG, ">B")
 
+    _fifo_enable = RWBit(_ICM20X_USER_CTRL, 6)
+    _fifo_sources = UnaryStruct(_ICM20X_FIFO_EN_2, ">B")
+    _fifo_reset_reg = UnaryStruct(_ICM20X_FIFO_RST, ">B")
+    _fifo_snapshot = RWBit(_ICM20X_FIFO_MODE, 0)
+    _fifo_count = ROUnaryStruct(_ICM20X_FIFO_COUNTH, ">H")
+
+    _int_active_low = RWBit(_ICM20X_REG_INT_PIN_CFG, 7)
+    _int_open_drain = RWBit(_ICM20X_REG_INT_PIN_CFG, 6)
+    _int_latched = RWBit(_ICM20X_REG_INT_PIN_CFG, 5)
+    _int_any_read_clears = RWBit(_ICM20X_REG_INT_PIN_CFG, 4)
+    _wom_int_enable = RWBit(_ICM20X_REG_INT_ENABLE_0, 3)
+    _data_ready_int_enable = RWBit(_ICM20X_REG_INT_ENABLE_1, 0)
+    _fifo_watermark_int_enable = RWBits(5, _ICM20X_REG_INT_ENABLE_3, 0)
+    _int_status = Struct(_ICM20X_INT_STATUS, ">BBBB")
+
     _i2c_master_cycle_en = RWBit(_ICM20X_LP_CONFIG, 6)
     _accel_cycle_en = RWBit(_ICM20X_LP_CONFIG, 5)
     _gyro_cycle_en = RWBit(_ICM20X_LP_CONFIG, 4)
 
-    # Bank 2
-    _gyro_dlpf_enable = RWBits(1, _ICM20X_GYRO_CONFIG_1, 0)
-    _gyro_range = RWBits(2, _ICM20X_GYRO_CONFIG_1, 1)
-    _gyro_dlpf_config = RWBits(3, _ICM20X_GYRO_CONFIG_1, 3)
-
-    _accel_dlpf_enable = RWBits(1, _ICM20X_ACCEL_CONFIG_1, 0)
-    _accel_range = RWBits(2, _ICM20X_ACCEL_CONFIG_1, 1)
-    _accel_dlpf_config = RWBits(3, _ICM20X_ACCEL_CONFIG_1, 3)
-
-    # this value is a 12-bit register spread across two bytes, big-endian first
-    _accel_rate_divisor = UnaryStruct(_ICM20X_ACCEL_SMPLRT_DIV_1, ">H")
-    _gyro_rate_divisor = UnaryStruct(_ICM20X_GYRO_SMPLRT_DIV, ">B")
+    # Banks 2 and 3 hold configuration only the driver changes, so they are kept in
+    # the RAM shadow below rather than read through register descriptors
     AccelDLPFFreq.add_values(
         (
             (
@@ -211,67 +276,257 @@ class ICM20X:  # pylint:disable=too-many-instance-attributes
         )
     )
 
+    # the selected bank is shadowed so that back-to-back accesses to the same bank only
+    # cost the data transaction; ``None`` means the shadow is unknown and must be rewritten
     @property
     def _bank(self):
-        return self._bank_reg >> 4
+        if self._cached_bank is None:
+            self._cached_bank = self._bank_reg >> 4
+        return self._cached_bank
 
     @_bank.setter
     def _bank(self, value):
+        if value == self._cached_bank:
+            return
         self._bank_reg = value << 4
+        self._cached_bank = value
+
+    def _invalidate_bank(self):
+        """Forget the shadowed bank so the next access rewrites ``REG_BANK_SEL``"""
+        self._cached_bank = None
 
-    def __init__(self, i2c_bus, address):
+    def __init__(self, i2c_bus, address, *, warm_start=False):
 
         self.i2c_device = i2c_device.I2CDevice(i2c_bus, address)
+        self._burst_cmd = bytearray((_ICM20X_ACCEL_XOUT_H,))
+        self._burst_buffer = bytearray(self._burst_length)
+        self._fifo_cmd = bytearray((_ICM20X_FIFO_R_W,))
+        self._axes_cmd = bytearray(1)
+        self._axes_buffer = bytearray(6)
+        self._fifo_buffer = None
+        self._fifo_layout = (False, False, False)
+        self.fifo_overflow_count = 0
+        self._fifo_next_ns = 0
+        # set to record ``time.monotonic_ns()`` in :attr:`last_read_ns` just before every data
+        # read, off by default as on CircuitPython the nanoseconds are a long int on the heap
+        self.timestamp_reads = False
+        self.last_read_ns = 0
+        self._cached_bank = None
+        # RAM copies of the bank 2 and 3 configuration registers, with a bitmask per bank
+        # of the registers changed since the last commit
+        self._config_shadow = (
+            None,
+            None,
+            bytearray(_ICM20X_BANK_2_SHADOW_SIZE),
+            bytearray(_ICM20X_BANK_3_SHADOW_SIZE),
+        )
+        self._config_dirty = [0, 0, 0, 0]
+        self._batch_depth = 0
+        self._batch = _ConfigurationBatch(self)
+        self._settle_deadline = 0
+        self._asleep = True
+        # what to restore on leaving low power mode, None at full rate
+        self._full_power_state = None
         self._bank = 0
         if not self._device_id in [_ICM20649_DEVICE_ID, _ICM20948_DEVICE_ID]:
             raise RuntimeError("Failed to find an ICM20X sensor - check your wiring!")
-        self.reset()
-        self.initialize()
+        # after a watchdog reset or deep sleep the sensor may still be running as configured
+        self.warm_started = warm_start and self._warm_start()
+        if not self.warm_started:
+            self.reset()
+            self.initialize()
+
+    def _default_configuration(self):  # pylint:disable=no-self-use
+        return {
+            "accelerometer_range": AccelRange.RANGE_8G,  # pylint: disable=no-member
+            "gyro_range": GyroRange.RANGE_500_DPS,  # pylint: disable=no-member
+            "accelerometer_data_rate_divisor": 20,  # ~53.57Hz
+            "gyro_data_rate_divisor": 10,  # ~100Hz
+        }
 
     def initialize(self):
         """Configure the sensors with the default settings. For use after calling :meth:`reset`"""
 
+        # configured while still asleep from the reset, so the new ranges settle during wake-up
+        self.configure(**self._default_configuration())
         self._sleep = False
-        self.accelerometer_range = AccelRange.RANGE_8G  # pylint: disable=no-member
-        self.gyro_range = GyroRange.RANGE_500_DPS  # pylint: disable=no-member
 
-        self.accelerometer_data_rate_divisor = 20  # ~53.57Hz
-        self.gyro_data_rate_divisor = 10  # ~100Hz
+    def configure(
+        self,
+        *,
+        accelerometer_range,
+        gyro_range,
+        accelerometer_data_rate_divisor,
+        gyro_data_rate_divisor,
+        accel_dlpf_cutoff=None,
+        gyro_dlpf_cutoff=None,
+    ):
+        """Applies the ranges, data rate divisors and low pass filters as one batch of register
+        writes, see :meth:`batch_configuration`.
+
+        :param int accelerometer_range: Must be an `AccelRange`
+        :param int gyro_range: Must be a `GyroRange`
+        :param int accelerometer_data_rate_divisor: See :attr:`accelerometer_data_rate_divisor`
+        :param int gyro_data_rate_divisor: See :attr:`gyro_data_rate_divisor`
+        :param int accel_dlpf_cutoff: An `AccelDLPFFreq`, or ``None`` to leave the filter as it is
+        :param int gyro_dlpf_cutoff: A `GyroDLPFFreq`, or ``None`` to leave the filter as it is
+        """
+        with self._batch:
+            self.accelerometer_range = accelerometer_range
+            self.gyro_range = gyro_range
+            self.accelerometer_data_rate_divisor = accelerometer_data_rate_divisor
+            self.gyro_data_rate_divisor = gyro_data_rate_divisor
+            if accel_dlpf_cutoff is not None:
+                self.accel_dlpf_cutoff = accel_dlpf_cutoff
+            if gyro_dlpf_cutoff is not None:
+                self.gyro_dlpf_cutoff = gyro_dlpf_cutoff
+
+    def batch_configuration(self):
+        """A context manager that holds back configuration writes until it exits, then sends
+        them with :meth:`commit`. Several settings that share a register cost a single write.
+
+        .. code-block:: python
+
+            with icm.batch_configuration():
+                icm.gyro_range = adafruit_icm20x.GyroRange.RANGE_1000_DPS
+                icm.gyro_dlpf_cutoff = adafruit_icm20x.GyroDLPFFreq.FREQ_51_2HZ_3DB
+        """
+        return self._batch
+
+    def commit(self):
+        """Writes every configuration register changed since the last commit. Runs of changed
+        registers go out in one transaction each, and runs separated by only a couple of
+        unchanged registers are merged by rewriting those from the shadow."""
+        for bank in (2, 3):
+            dirty = self._config_dirty[bank]
+            if not dirty:
+                continue
+            shadow = self._config_shadow[bank]
+            self._bank = bank
+            start = None
+            for register in range(len(shadow) + 1):
+                if dirty >> register & 1:
+                    if start is None:
+                        start = register
+                    end = register
+                elif start is not None and (
+                    register - end > _ICM20X_MAX_SHADOW_GAP or not dirty >> register
+                ):
+                    self._write_registers(start, shadow[start : end + 1])
+                    start = None
+            self._config_dirty[bank] = 0
+        self._bank = 0
+
+    def _get_config_bits(self, bank, register, count, shift):
+        return self._config_shadow[bank][register] >> shift & ((1 << count) - 1)
+
+    def _set_config_bits(self, bank, register, count, shift, value):
+        shadow = self._config_shadow[bank]
+        mask = ((1 << count) - 1) << shift
+        shadow[register] = shadow[register] & ~mask | (value << shift) & mask
+        self._config_dirty[bank] |= 1 << register
+        if not self._batch_depth:
+            self.commit()
+
+    def _set_config_register(self, bank, register, value):
+        self._set_config_bits(bank, register, 8, 0, value)
+
+    def _load_config_shadow(self):
+        """Reads the shadowed bank 2 and 3 registers back from the sensor"""
+        for bank in (2, 3):
+            self._bank = bank
+            with self.i2c_device as i2c:
+                i2c.write_then_readinto(bytes((0,)), self._config_shadow[bank])
+            self._config_dirty[bank] = 0
+        self._bank = 0
+        # precomputed so reads cost one multiply per axis
+        self._accel_scale = G_TO_ACCEL / AccelRange.lsb[self.accelerometer_range]
+        self._gyro_scale = _ICM20X_RAD_PER_DEG / GyroRange.lsb[self.gyro_range]
+
+    def _write_registers(self, register, values):
+        """Writes consecutive registers of the current bank in a single transaction"""
+        with self.i2c_device as i2c:
+            i2c.write(bytes((register,)) + bytes(values))
+
+    def _warm_start(self):
+        """Adopts the running configuration instead of resetting when the sensor is awake and
+        its configuration already matches what :meth:`initialize` would write"""
+        if self._sleep:
+            return False
+        self._load_config_shadow()
+        config = self._default_configuration()
+        if (
+            self.accelerometer_range != config["accelerometer_range"]
+            or self.gyro_range != config["gyro_range"]
+            or self.accelerometer_data_rate_divisor
+            != config["accelerometer_data_rate_divisor"]
+            or self.gyro_data_rate_divisor != config["gyro_data_rate_divisor"]
+        ):
+            return False
+        self._asleep = False
+        return True
 
     def reset(self):
         """Resets the internal registers and restores the default settings"""
+        self._invalidate_bank()
         self._bank = 0
 
-        sleep(0.005)
         self._reset = True
-        sleep(0.005)
+        self._settle(_ICM20X_RESET_SETTLE)
+        self._wait_settled()
         while self._reset:
-            sleep(0.005)
+            sleep(_ICM20X_POLL_INTERVAL)
+        # the reset returns the device to bank 0 and puts it to sleep behind our back
+        self._invalidate_bank()
+        self._asleep = True
+        self._full_power_state = None
+        self._load_config_shadow()
+
+    def _settle(self, seconds):
+        """Hold off the next dependent access until ``seconds`` after the current write"""
+        deadline = monotonic_ns() + int(seconds * 1000000000)
+        if deadline > self._settle_deadline:
+            self._settle_deadline = deadline
+
+    def _wait_settled(self):
+        """Block for whatever is left of the pending settle time, if any"""
+        if not self._settle_deadline:
+            return
+        remaining = self._settle_deadline - monotonic_ns()
+        self._settle_deadline = 0
+        if remaining > 0:
+            sleep(remaining / 1000000000)
+
+    def _prepare_read(self):
+        """Anything owed before a data read, done ahead of :class:`ICM20XGroup` taking the bus"""
+        self._wait_settled()
 
     @property
     def _sleep(self):
         self._bank = 0
-        sleep(0.005)
-        self._sleep_reg = False
-        sleep(0.005)
+        return self._sleep_reg
 
     @_sleep.setter
     def _sleep(self, sleep_enabled):
         self._bank = 0
-        sleep(0.005)
         self._sleep_reg = sleep_enabled
-        sleep(0.005)
+        if self._asleep and not sleep_enabled:
+            self._settle(_ICM20X_WAKE_SETTLE)
+        self._asleep = sleep_enabled
 
     @property
     def acceleration(self):
         """The x, y, z acceleration values returned in a 3-tuple and are in :math:`m / s ^ 2.`"""
         self._bank = 0
+        self._wait_settled()
+        if self.timestamp_reads:
+            self.last_read_ns = monotonic_ns()
         raw_accel_data = self._raw_accel_data
-        sleep(0.005)
+        scale = self._accel_scale
 
-        x = self._scale_xl_data(raw_accel_data[0])
-        y = self._scale_xl_data(raw_accel_data[1])
-        z = self._scale_xl_data(raw_accel_data[2])
+        x = raw_accel_data[0] * scale
+        y = raw_accel_data[1] * scale
+        z = raw_accel_data[2] * scale
 
         return (x, y, z)
 
@@ -280,57 +535,558 @@ class ICM20X:  # pylint:disable=too-many-instance-attributes
         """The x, y, z angular velocity values returned in a 3-tuple and
         are in :math:`degrees / second`"""
         self._bank = 0
+        self._wait_settled()
+        if self.timestamp_reads:
+            self.last_read_ns = monotonic_ns()
         raw_gyro_data = self._raw_gyro_data
-        x = self._scale_gyro_data(raw_gyro_data[0])
-        y = self._scale_gyro_data(raw_gyro_data[1])
-        z = self._scale_gyro_data(raw_gyro_data[2])
+        scale = self._gyro_scale
+        x = raw_gyro_data[0] * scale
+        y = raw_gyro_data[1] * scale
+        z = raw_gyro_data[2] * scale
 
         return (x, y, z)
 
-    def _scale_xl_data(self, raw_measurement):
-        sleep(0.005)
-        return raw_measurement / AccelRange.lsb[self._cached_accel_range] * G_TO_ACCEL
+    def _read_axes(self, register):
+        """Reads three 16-bit axes starting at ``register`` into the reusable axes buffer"""
+        self._bank = 0
+        self._wait_settled()
+        self._axes_cmd[0] = register
+        if self.timestamp_reads:
+            self.last_read_ns = monotonic_ns()
+        with self.i2c_device as i2c:
+            i2c.write_then_readinto(self._axes_cmd, self._axes_buffer)
+        return self._axes_buffer
+
+    def acceleration_into(self, buf):
+        """Fills ``buf[0:3]`` with the x, y, z acceleration in :math:`m / s ^ 2`, like
+        :attr:`acceleration` but without allocating a tuple. ``buf`` is typically an
+        ``array('f')`` reused for every read. Returns ``buf``."""
+        data = self._read_axes(_ICM20X_ACCEL_XOUT_H)
+        scale = self._accel_scale
+        buf[0] = _be_int16(data[0], data[1]) * scale
+        buf[1] = _be_int16(data[2], data[3]) * scale
+        buf[2] = _be_int16(data[4], data[5]) * scale
+        return buf
+
+    def gyro_into(self, buf):
+        """Fills ``buf[0:3]`` with the x, y, z angular velocity in radians / second, like
+        :attr:`gyro` but without allocating a tuple. ``buf`` is typically an ``array('f')``
+        reused for every read. Returns ``buf``."""
+        data = self._read_axes(_ICM20X_GYRO_XOUT_H)
+        scale = self._gyro_scale
+        buf[0] = _be_int16(data[0], data[1]) * scale
+        buf[1] = _be_int16(data[2], data[3]) * scale
+        buf[2] = _be_int16(data[4], data[5]) * scale
+        return buf
+
+    def gyro_raw_into(self, buf):
+        """Fills ``buf[0:3]`` with the x, y, z angular velocity as signed 16-bit register counts,
+        like :attr:`gyro_raw` without allocating a tuple or any float. ``buf`` is typically
+        an ``array('h')`` reused for every read. Returns ``buf``."""
+        data = self._read_axes(_ICM20X_GYRO_XOUT_H)
+        buf[0] = _be_int16(data[0], data[1])
+        buf[1] = _be_int16(data[2], data[3])
+        buf[2] = _be_int16(data[4], data[5])
+        return buf
+
+    @property
+    def acceleration_raw(self):
+        """The x, y, z acceleration values as signed 16-bit register counts, without any float
+        conversion. Multiply by :attr:`acceleration_scale` to get :math:`m / s ^ 2`"""
+        self._bank = 0
+        self._wait_settled()
+        if self.timestamp_reads:
+            self.last_read_ns = monotonic_ns()
+        return self._raw_accel_data
+
+    @property
+    def gyro_raw(self):
+        """The x, y, z angular velocity values as signed 16-bit register counts, without any
+        float conversion. Multiply by :attr:`gyro_scale` to get radians / second"""
+        self._bank = 0
+        self._wait_settled()
+        if self.timestamp_reads:
+            self.last_read_ns = monotonic_ns()
+        return self._raw_gyro_data
+
+    @property
+    def acceleration_scale(self):
+        """:math:`m / s ^ 2` per count of :attr:`acceleration_raw` at the current range"""
+        return self._accel_scale
+
+    @property
+    def gyro_scale(self):
+        """Radians / second per count of :attr:`gyro_raw` at the current range"""
+        return self._gyro_scale
+
+    @property
+    def temperature(self):
+        """The temperature of the sensor die in degrees Celsius"""
+        self._bank = 0
+        self._wait_settled()
+        return self._raw_temp_data / _ICM20X_TEMP_LSB_PER_DEG_C + _ICM20X_TEMP_OFFSET
+
+    def _read_burst(self):
+        """Reads all of the data registers in one transaction into the burst buffer"""
+        self._bank = 0
+        self._wait_settled()
+        if self.timestamp_reads:
+            self.last_read_ns = monotonic_ns()
+        with self.i2c_device as i2c:
+            i2c.write_then_readinto(self._burst_cmd, self._burst_buffer)
+        return self._burst_buffer
+
+    def _decode_burst(self, buffer):
+        raw = unpack_from(">hhhhhhh", buffer)
+        accel_scale = self._accel_scale
+        gyro_scale = self._gyro_scale
+        acceleration = (raw[0] * accel_scale, raw[1] * accel_scale, raw[2] * accel_scale)
+        gyro = (raw[3] * gyro_scale, raw[4] * gyro_scale, raw[5] * gyro_scale)
+        temperature = raw[6] / _ICM20X_TEMP_LSB_PER_DEG_C + _ICM20X_TEMP_OFFSET
+        return (acceleration, gyro, temperature)
+
+    def read_all(self):
+        """Reads every sensor in a single I2C transaction so that all of the values come from
+        the same sampling instant. Returns ``(acceleration, gyro, temperature)`` in the same
+        units as :attr:`acceleration`, :attr:`gyro` and :attr:`temperature`"""
+        return self._decode_burst(self._read_burst())
+
+    @property
+    def motion(self):
+        """The result of :meth:`read_all`: every axis from one sampling instant"""
+        return self.read_all()
+
+    def enable_fifo(self, *, acceleration=True, gyro=True, temperature=False):
+        """Starts buffering samples in the sensor's FIFO at the configured data rates so they can
+        be drained in batches with :meth:`read_fifo`. The FIFO is cleared when it is enabled.
+
+        .. note::
+            When both the accelerometer and the gyro are buffered their data rates should
+            match, otherwise frames are written at the faster rate with repeated values.
+
+        :param bool acceleration: Buffer accelerometer samples
+        :param bool gyro: Buffer gyro samples
+        :param bool temperature: Buffer temperature samples
+        """
+        if not (acceleration or gyro or temperature):
+            raise AttributeError("at least one sensor must be written to the FIFO")
+        self._fifo_layout = (acceleration, gyro, temperature)
+        frame_size = self.fifo_frame_size
+        # drain in whole frames; only allocated by users of the FIFO
+        self._fifo_buffer = bytearray(_ICM20X_FIFO_SIZE // frame_size * frame_size)
+
+        self._bank = 0
+        self._fifo_enable = False
+        # frames stay aligned if the FIFO stops accepting data when full
+        self._fifo_snapshot = True
+        self._fifo_sources = (
+            (0x10 if acceleration else 0) | (0x0E if gyro else 0) | (0x01 if temperature else 0)
+        )
+        self.reset_fifo()
+        self._fifo_enable = True
+
+    def disable_fifo(self):
+        """Stops writing samples to the FIFO and clears it"""
+        self._bank = 0
+        self._fifo_enable = False
+        self._fifo_sources = 0
+        self.reset_fifo()
+        self._fifo_layout = (False, False, False)
+        self._fifo_buffer = None
+
+    def reset_fifo(self):
+        """Discards everything in the FIFO"""
+        self._bank = 0
+        self._fifo_reset_reg = 0x1F
+        self._fifo_reset_reg = 0x00
+        self._fifo_next_ns = 0
+
+    @property
+    def fifo_frame_size(self):
+        """The number of bytes each sample occupies in the FIFO"""
+        acceleration, gyro, temperature = self._fifo_layout
+        return (6 if acceleration else 0) + (6 if gyro else 0) + (2 if temperature else 0)
+
+    @property
+    def fifo_count(self):
+        """The number of bytes waiting in the FIFO"""
+        self._bank = 0
+        return self._fifo_count & 0x1FFF
+
+    def read_fifo(self, raw=False, *, timestamps=False):
+        """Drains every complete frame waiting in the FIFO, yielding one
+        ``(acceleration, gyro, temperature)`` tuple per sample, oldest first. Sensors that
+        are not buffered are ``None``. The FIFO is read in as few transactions as fit in
+        the drain buffer.
+
+        If the FIFO filled up since the last drain, newer samples were dropped and
+        :attr:`fifo_overflow_count` is incremented.
+
+        :param bool raw: Yield the raw signed 16-bit register values instead of scaled ones
+        :param bool timestamps: Yield ``(timestamp_ns, acceleration, gyro, temperature)``,
+            where ``timestamp_ns`` is on the ``time.monotonic_ns()`` clock. Frames are spaced
+            exactly one sample period apart, continuing from the previous drain, so the
+            differences between them are the sensor's sample interval however late the
+            drains run. The chain is re-anchored to the newest frame arriving as the FIFO is
+            read whenever it strays by more than a period, or after a reset or overflow.
+        """
+        if self._fifo_buffer is None:
+            raise RuntimeError("the FIFO must be enabled with `enable_fifo` first")
+        buffer = self._fifo_buffer
+        frame_size = self.fifo_frame_size
+        if timestamps or self.timestamp_reads:
+            now = monotonic_ns()
+            self.last_read_ns = now
+        count = self.fifo_count
+        if count + frame_size > _ICM20X_FIFO_SIZE:
+            self.fifo_overflow_count += 1
+            self._fifo_next_ns = 0
+        available = count // frame_size * frame_size
+
+        if timestamps and available:
+            if self._fifo_layout[1]:
+                period = self.sample_period_ns
+            else:
+                period = (1 + self.accelerometer_data_rate_divisor) * 1000000000 // 1125
+            frames = available // frame_size
+            timestamp = now - (frames - 1) * period
+            if self._fifo_next_ns and abs(self._fifo_next_ns - timestamp) < period:
+                timestamp = self._fifo_next_ns
+            self._fifo_next_ns = timestamp + frames * period
+
+        while available:
+            chunk = min(available, len(buffer))
+            self._bank = 0
+            with self.i2c_device as i2c:
+                i2c.write_then_readinto(self._fifo_cmd, buffer, in_end=chunk)
+            available -= chunk
+            for offset in range(0, chunk, frame_size):
+                if timestamps:
+                    yield (timestamp,) + self._decode_fifo_frame(buffer, offset, raw)
+                    timestamp += period
+                else:
+                    yield self._decode_fifo_frame(buffer, offset, raw)
+
+    def _decode_fifo_frame(self, buffer, offset, raw):
+        acceleration = gyro = temperature = None
+        has_acceleration, has_gyro, has_temperature = self._fifo_layout
+        if has_acceleration:
+            acceleration = unpack_from(">hhh", buffer, offset)
+            offset += 6
+            if not raw:
+                scale = self._accel_scale
+                acceleration = (
+                    acceleration[0] * scale,
+                    acceleration[1] * scale,
+                    acceleration[2] * scale,
+                )
+        if has_gyro:
+            gyro = unpack_from(">hhh", buffer, offset)
+            offset += 6
+            if not raw:
+                scale = self._gyro_scale
+                gyro = (gyro[0] * scale, gyro[1] * scale, gyro[2] * scale)
+        if has_temperature:
+            temperature = unpack_from(">h", buffer, offset)[0]
+            if not raw:
+                temperature = (
+                    temperature / _ICM20X_TEMP_LSB_PER_DEG_C + _ICM20X_TEMP_OFFSET
+                )
+        return (acceleration, gyro, temperature)
+
+    @property
+    def gyro_offsets(self):
+        """The x, y, z values the sensor adds to every gyro sample before it reaches the data
+        registers (and the FIFO), as signed 16-bit counts. One count is 4 raw counts at the
+        lowest gyro range, 1/32.8 degrees/second on the ICM20948. Usually set by
+        :meth:`calibrate_gyro`; save and restore them to skip recalibrating."""
+        shadow = self._config_shadow[2]
+        register = _ICM20X_XG_OFFS_USRH
+        return (
+            _be_int16(shadow[register], shadow[register + 1]),
+            _be_int16(shadow[register + 2], shadow[register + 3]),
+            _be_int16(shadow[register + 4], shadow[register + 5]),
+        )
+
+    @gyro_offsets.setter
+    def gyro_offsets(self, offsets):
+        # all three axes are adjacent, so this is a single write
+        with self._batch:
+            for axis in range(3):
+                register = _ICM20X_XG_OFFS_USRH + 2 * axis
+                offset = max(-32768, min(32767, int(offsets[axis]))) & 0xFFFF
+                self._set_config_register(2, register, offset >> 8)
+                self._set_config_register(2, register + 1, offset & 0xFF)
+
+    def calibrate_gyro(self, samples=100, *, apply=True, max_deviation=None):
+        """Measures the gyro's zero-rate bias. The sensor must be held still while ``samples``
+        gyro samples are collected through the FIFO at the configured data rate, so this
+        takes ``samples / gyro_data_rate`` seconds. Any FIFO configuration is restored
+        afterwards, though frames that were waiting in it are discarded.
+
+        :param int samples: The number of samples to average
+        :param bool apply: Add the measured bias to :attr:`gyro_offsets` so the sensor
+            subtracts it from every following sample at no cost to the host
+        :param float max_deviation: If given, the largest standard deviation, in
+            radians/second, an axis may show before the sensor is considered to have moved.
+            A :class:`RuntimeError` is raised and nothing is applied if it is exceeded.
+        :return: The per axis bias and variance as ``((x, y, z), (x, y, z))`` in radians/second
+            and radians/second squared
+
+        A :class:`RuntimeError` is raised if the sensor is asleep, in :attr:`low_power` or
+        has the gyro off, or if the samples haven't arrived in four times as long as they
+        should take.
+        """
+        if samples < 2:
+            raise AttributeError("samples must be at least 2")
+        if self.low_power or self._sleep or self._gyro_disable:
+            raise RuntimeError("the gyro must be running at full power to calibrate it")
+        restore = self._fifo_layout
+        self.enable_fifo(acceleration=False, gyro=True)
+        capacity = len(self._fifo_buffer) // self.fifo_frame_size
+        period = (1 + self.gyro_data_rate_divisor) / 1100
+
+        # running mean and sum of squared differences (Welford) per axis
+        count = 0
+        mean = [0.0, 0.0, 0.0]
+        m2 = [0.0, 0.0, 0.0]
+        self._wait_settled()
+        deadline = monotonic_ns() + int(4 * samples * period * 1000000000)
+        try:
+            while count < samples:
+                if monotonic_ns() > deadline:
+                    raise RuntimeError("gyro samples stopped reaching the FIFO")
+                sleep(min(samples - count, capacity) * period)
+                for _acceleration, gyro, _temperature in self.read_fifo(raw=True):
+                    count += 1
+                    for axis in range(3):
+                        delta = gyro[axis] - mean[axis]
+                        mean[axis] += delta / count
+                        m2[axis] += delta * (gyro[axis] - mean[axis])
+                    if count == samples:
+                        break
+        finally:
+            if restore[0] or restore[1] or restore[2]:
+                self.enable_fifo(
+                    acceleration=restore[0], gyro=restore[1], temperature=restore[2]
+                )
+            else:
+                self.disable_fifo()
+
+        scale = self._gyro_scale
+        bias = (mean[0] * scale, mean[1] * scale, mean[2] * scale)
+        variance = (
+            m2[0] / (count - 1) * scale * scale,
+            m2[1] / (count - 1) * scale * scale,
+            m2[2] / (count - 1) * scale * scale,
+        )
+        if max_deviation is not None:
+            limit = max_deviation * max_deviation
+            if variance[0] > limit or variance[1] > limit or variance[2] > limit:
+                raise RuntimeError("the sensor moved during gyro calibration")
+
+        if apply:
+            # offset counts per raw count at the current range
+            ratio = GyroRange.lsb[0] / 4 / GyroRange.lsb[self.gyro_range]
+            offsets = self.gyro_offsets
+            self.gyro_offsets = (
+                offsets[0] - round(mean[0] * ratio),
+                offsets[1] - round(mean[1] * ratio),
+                offsets[2] - round(mean[2] * ratio),
+            )
+        return (bias, variance)
+
+    def configure_interrupt_pin(
+        self, *, active_low=False, open_drain=False, latched=False, clear_on_any_read=True
+    ):
+        """Sets how the INT pin signals the interrupts enabled with :attr:`data_ready_interrupt`,
+        :attr:`fifo_watermark_interrupt` and :attr:`wake_on_motion_threshold`
+
+        :param bool active_low: Drive the pin low rather than high when an interrupt fires
+        :param bool open_drain: Use an open drain output instead of push-pull
+        :param bool latched: Hold the pin until the interrupt is cleared rather than pulsing it
+            for 50us
+        :param bool clear_on_any_read: Clear a latched interrupt on any register read instead
+            of only on reading :attr:`interrupt_status`, so normal data reads re-arm the pin
+            without an extra transaction
+        """
+        self._bank = 0
+        self._int_active_low = active_low
+        self._int_open_drain = open_drain
+        self._int_latched = latched
+        self._int_any_read_clears = clear_on_any_read
+
+    @property
+    def data_ready_interrupt(self):
+        """Raise the INT pin each time a new sample reaches the data registers"""
+        self._bank = 0
+        return self._data_ready_int_enable
+
+    @data_ready_interrupt.setter
+    def data_ready_interrupt(self, enabled):
+        self._bank = 0
+        self._data_ready_int_enable = enabled
+
+    @property
+    def fifo_watermark_interrupt(self):
+        """Raise the INT pin when the FIFO fills to the chip's watermark. The datasheet doesn't
+        give the level and there is no register to set it, so check :attr:`fifo_count` when it
+        fires rather than relying on a number of frames"""
+        self._bank = 0
+        return bool(self._fifo_watermark_int_enable)
+
+    @fifo_watermark_interrupt.setter
+    def fifo_watermark_interrupt(self, enabled):
+        self._bank = 0
+        self._fifo_watermark_int_enable = 0x1F if enabled else 0
+
+    @property
+    def wake_on_motion_threshold(self):
+        """The change in acceleration, in milli-g, between two accelerometer samples on any
+        axis that raises the INT pin. From 4 to 1020 in steps of 4, or ``None`` to disable
+        wake on motion.
+
+        .. note::
+            Motion is detected at the accelerometer data rate, which in a low power mode can be
+            far slower than the gyro's.
+        """
+        if not self._get_config_bits(2, _ICM20X_ACCEL_INTEL_CTRL, 1, 1):
+            return None
+        return self._config_shadow[2][_ICM20X_ACCEL_WOM_THR] * _ICM20X_WOM_MG_PER_LSB
+
+    @wake_on_motion_threshold.setter
+    def wake_on_motion_threshold(self, threshold):
+        if threshold is None:
+            self._bank = 0
+            self._wom_int_enable = False
+            self._set_config_register(2, _ICM20X_ACCEL_INTEL_CTRL, 0x00)
+            return
+        if not _ICM20X_WOM_MG_PER_LSB <= threshold <= 255 * _ICM20X_WOM_MG_PER_LSB:
+            raise AttributeError("wake_on_motion_threshold must be between 4 and 1020 mg")
+        with self._batch:
+            self._set_config_register(
+                2, _ICM20X_ACCEL_WOM_THR, int(threshold) // _ICM20X_WOM_MG_PER_LSB
+            )
+            # enable the logic, comparing each sample against the previous one
+            self._set_config_register(2, _ICM20X_ACCEL_INTEL_CTRL, 0x03)
+        self._bank = 0
+        self._wom_int_enable = True
 
-    def _scale_gyro_data(self, raw_measurement):
+    @property
+    def interrupt_status(self):
+        """Which interrupts have fired since the status was last read, as a
+        ``(wake_on_motion, data_ready, fifo_overflow, fifo_watermark)`` tuple of bools. Reading
+        the status clears it."""
+        self._bank = 0
+        status, data_status, overflow_status, watermark_status = self._int_status
         return (
-            raw_measurement / GyroRange.lsb[self._cached_gyro_range]
-        ) * _ICM20X_RAD_PER_DEG
+            bool(status & 0x08),
+            bool(data_status & 0x01),
+            bool(overflow_status & 0x1F),
+            bool(watermark_status & 0x1F),
+        )
+
+    @property
+    def low_power(self):
+        """``True`` while the sensor is duty cycling, see :meth:`enter_low_power`"""
+        return self._full_power_state is not None
+
+    def enter_low_power(self, rate=10, *, wake_threshold=None, gyro=False):
+        """Duty cycles the sensor: it sleeps between samples taken at about ``rate`` Hz,
+        bringing the supply current down from milliamps to a few microamps with the gyro off.
+        The full rate configuration is kept and restored by :meth:`exit_low_power`.
+
+        :param float rate: The sample rate to run at, in Hz. The accelerometer's divisor is
+            chosen for the nearest rate it supports.
+        :param int wake_threshold: If given, set :attr:`wake_on_motion_threshold` so motion
+            raises the INT pin and :meth:`check_motion_wake` returns to full rate
+        :param bool gyro: Keep the gyro running, duty cycled at the same rate, instead of
+            turning it off. It needs far more power than the accelerometer even cycled.
+        """
+        if rate < self._accel_rate_calc(4095) or rate > self._accel_rate_calc(0):
+            raise AttributeError("rate must be between 0.27 and 1125.0")
+        self._bank = 0
+        if self._full_power_state is None:
+            self._full_power_state = (
+                self.accelerometer_data_rate_divisor,
+                self.gyro_data_rate_divisor,
+                self.wake_on_motion_threshold,
+                self._lp_config_reg,
+            )
+        lp_config = self._full_power_state[3]
+        with self._batch:
+            self.accelerometer_data_rate_divisor = max(0, min(4095, round(1125 / rate - 1)))
+            if gyro:
+                self.gyro_data_rate_divisor = max(0, min(255, round(1100 / rate - 1)))
+            if wake_threshold is not None:
+                self.wake_on_motion_threshold = wake_threshold
+        self._bank = 0
+        self._gyro_disable = 0 if gyro else 0x7
+        # the I2C master, accel and, if running, gyro only wake up for each sample
+        self._lp_config_reg = lp_config | (0x70 if gyro else 0x60)
+        self._low_power = True
+
+    def exit_low_power(self):
+        """Returns to continuous sampling with the configuration in place before
+        :meth:`enter_low_power`. A gyro that was off needs 35ms to start, which the next gyro
+        read waits out."""
+        if self._full_power_state is None:
+            return
+        accel_divisor, gyro_divisor, wake_threshold, lp_config = self._full_power_state
+        self._low_power = False
+        self._lp_config_reg = lp_config
+        if self._gyro_disable:
+            self._gyro_disable = 0
+            self._settle(_ICM20X_WAKE_SETTLE)
+        with self._batch:
+            self.accelerometer_data_rate_divisor = accel_divisor
+            self.gyro_data_rate_divisor = gyro_divisor
+            self.wake_on_motion_threshold = wake_threshold
+        self._full_power_state = None
+
+    def check_motion_wake(self):
+        """In low power mode, checks whether wake on motion has fired and if so returns to full
+        rate with :meth:`exit_low_power`. Costs one read while nothing has moved. Clears
+        :attr:`interrupt_status`.
+
+        :return: ``True`` if motion woke the sensor
+        """
+        if self._full_power_state is None or not self.interrupt_status[0]:
+            return False
+        self.exit_low_power()
+        return True
 
     @property
     def accelerometer_range(self):
         """Adjusts the range of values that the sensor can measure, from +/- 4G to +/-30G
         Note that larger ranges will be less accurate. Must be an `AccelRange`"""
-        return self._cached_accel_range
+        return self._get_config_bits(2, _ICM20X_ACCEL_CONFIG_1, 2, 1)
 
     @accelerometer_range.setter
     def accelerometer_range(self, value):  # pylint: disable=no-member
         if not AccelRange.is_valid(value):
             raise AttributeError("range must be an `AccelRange`")
-        self._bank = 2
-        sleep(0.005)
-        self._accel_range = value
-        sleep(0.005)
-        self._cached_accel_range = value
-        self._bank = 0
+        self._set_config_bits(2, _ICM20X_ACCEL_CONFIG_1, 2, 1, value)
+        # precomputed so reads cost one multiply per axis
+        self._accel_scale = G_TO_ACCEL / AccelRange.lsb[value]
+        if not self._asleep:
+            self._settle(_ICM20X_RANGE_SETTLE)
 
     @property
     def gyro_range(self):
         """Adjusts the range of values that the sensor can measure, from 500 Degrees/second to 4000
         degrees/s. Note that larger ranges will be less accurate. Must be a `GyroRange`"""
-        return self._cached_gyro_range
+        return self._get_config_bits(2, _ICM20X_GYRO_CONFIG_1, 2, 1)
 
     @gyro_range.setter
     def gyro_range(self, value):
         if not GyroRange.is_valid(value):
             raise AttributeError("range must be a `GyroRange`")
 
-        self._bank = 2
-        sleep(0.005)
-        self._gyro_range = value
-        sleep(0.005)
-        self._cached_gyro_range = value
-        self._bank = 0
-        sleep(0.100)  # needed to let new range settle
+        self._set_config_bits(2, _ICM20X_GYRO_CONFIG_1, 2, 1, value)
+        self._gyro_scale = _ICM20X_RAD_PER_DEG / GyroRange.lsb[value]
+        if not self._asleep:
+            self._settle(_ICM20X_RANGE_SETTLE)  # needed to let new range settle
 
     @property
     def accelerometer_data_rate_divisor(self):
@@ -348,20 +1104,20 @@ class ICM20X:  # pylint:disable=too-many-instance-attributes
         This function sets the raw rate divisor.
 
         """
-        self._bank = 2
-        raw_rate_divisor = self._accel_rate_divisor
-        sleep(0.005)
-        self._bank = 0
+        # this value is a 12-bit register spread across two bytes, big-endian first
+        shadow = self._config_shadow[2]
+        raw_rate_divisor = (
+            shadow[_ICM20X_ACCEL_SMPLRT_DIV_1] << 8 | shadow[_ICM20X_ACCEL_SMPLRT_DIV_2]
+        )
         # rate_hz = 1125/(1+raw_rate_divisor)
         return raw_rate_divisor
 
     @accelerometer_data_rate_divisor.setter
     def accelerometer_data_rate_divisor(self, value):
         # check that value <= 4095
-        self._bank = 2
-        sleep(0.005)
-        self._accel_rate_divisor = value
-        sleep(0.005)
+        with self._batch:
+            self._set_config_register(2, _ICM20X_ACCEL_SMPLRT_DIV_1, value >> 8 & 0x0F)
+            self._set_config_register(2, _ICM20X_ACCEL_SMPLRT_DIV_2, value & 0xFF)
 
     @property
     def gyro_data_rate_divisor(self):
@@ -379,20 +1135,20 @@ class ICM20X:  # pylint:disable=too-many-instance-attributes
         This function sets the raw rate divisor.
         """
 
-        self._bank = 2
-        raw_rate_divisor = self._gyro_rate_divisor
-        sleep(0.005)
-        self._bank = 0
+        raw_rate_divisor = self._config_shadow[2][_ICM20X_GYRO_SMPLRT_DIV]
         # rate_hz = 1100/(1+raw_rate_divisor)
         return raw_rate_divisor
 
     @gyro_data_rate_divisor.setter
     def gyro_data_rate_divisor(self, value):
         # check that value <= 255
-        self._bank = 2
-        sleep(0.005)
-        self._gyro_rate_divisor = value
-        sleep(0.005)
+        self._set_config_register(2, _ICM20X_GYRO_SMPLRT_DIV, value)
+
+    @property
+    def sample_period_ns(self):
+        """The time between gyro samples at the configured :attr:`gyro_data_rate_divisor`, in
+        nanoseconds. The interval to integrate the gyro over, independent of when it is read."""
+        return (1 + self.gyro_data_rate_divisor) * 1000000000 // 1100
 
     def _accel_rate_calc(self, divisor):  # pylint:disable=no-self-use
         return 1125 / (1 + divisor)
@@ -462,20 +1218,22 @@ class ICM20X:  # pylint:disable=too-many-instance-attributes
             inaccurate due to the filter "warming up"
 
         """
-        self._bank = 2
-        return self._accel_dlpf_config
+        if not self._get_config_bits(2, _ICM20X_ACCEL_CONFIG_1, 1, 0):
+            return AccelDLPFFreq.DISABLED  # pylint: disable=no-member
+        return self._get_config_bits(2, _ICM20X_ACCEL_CONFIG_1, 3, 3)
 
     @accel_dlpf_cutoff.setter
     def accel_dlpf_cutoff(self, cutoff_frequency):
         if not AccelDLPFFreq.is_valid(cutoff_frequency):
             raise AttributeError("accel_dlpf_cutoff must be an `AccelDLPFFreq`")
-        self._bank = 2
-        # check for shutdown
-        if cutoff_frequency is AccelDLPFFreq.DISABLED:  # pylint: disable=no-member
-            self._accel_dlpf_enable = False
-            return
-        self._accel_dlpf_enable = True
-        self._accel_dlpf_config = cutoff_frequency
+        # enable and config share a register, so this is a single write
+        with self._batch:
+            # check for shutdown
+            if cutoff_frequency is AccelDLPFFreq.DISABLED:  # pylint: disable=no-member
+                self._set_config_bits(2, _ICM20X_ACCEL_CONFIG_1, 1, 0, 0)
+                return
+            self._set_config_bits(2, _ICM20X_ACCEL_CONFIG_1, 1, 0, 1)
+            self._set_config_bits(2, _ICM20X_ACCEL_CONFIG_1, 3, 3, cutoff_frequency)
 
     @property
     def gyro_dlpf_cutoff(self):
@@ -488,20 +1246,22 @@ class ICM20X:  # pylint:disable=too-many-instance-attributes
             inaccurate due to the filter "warming up"
 
         """
-        self._bank = 2
-        return self._gyro_dlpf_config
+        if not self._get_config_bits(2, _ICM20X_GYRO_CONFIG_1, 1, 0):
+            return GyroDLPFFreq.DISABLED  # pylint: disable=no-member
+        return self._get_config_bits(2, _ICM20X_GYRO_CONFIG_1, 3, 3)
 
     @gyro_dlpf_cutoff.setter
     def gyro_dlpf_cutoff(self, cutoff_frequency):
         if not GyroDLPFFreq.is_valid(cutoff_frequency):
             raise AttributeError("gyro_dlpf_cutoff must be a `GyroDLPFFreq`")
-        self._bank = 2
-        # check for shutdown
-        if cutoff_frequency is GyroDLPFFreq.DISABLED:  # pylint: disable=no-member
-            self._gyro_dlpf_enable = False
-            return
-        self._gyro_dlpf_enable = True
-        self._gyro_dlpf_config = cutoff_frequency
+        # enable and config share a register, so this is a single write
+        with self._batch:
+            # check for shutdown
+            if cutoff_frequency is GyroDLPFFreq.DISABLED:  # pylint: disable=no-member
+                self._set_config_bits(2, _ICM20X_GYRO_CONFIG_1, 1, 0, 0)
+                return
+            self._set_config_bits(2, _ICM20X_GYRO_CONFIG_1, 1, 0, 1)
+            self._set_config_bits(2, _ICM20X_GYRO_CONFIG_1, 3, 3, cutoff_frequency)
 
     @property
     def _low_power(self):
@@ -519,6 +1279,8 @@ class ICM20649(ICM20X):
 
     :param ~busio.I2C i2c_bus: The I2C bus the ICM20649 is connected to.
     :param int address: The I2C address of the device. Defaults to :const:`0x68`
+    :param bool warm_start: Skip the reset and configuration if the sensor is already running
+        with the default configuration. Defaults to :const:`False`
 
     **Quickstart: Importing and using the ICM20649 temperature sensor**
 
@@ -547,7 +1309,7 @@ class ICM20649(ICM20X):
 
     """
 
-    def __init__(self, i2c_bus, address=_ICM20649_DEFAULT_ADDRESS):
+    def __init__(self, i2c_bus, address=_ICM20649_DEFAULT_ADDRESS, *, warm_start=False):
 
         AccelRange.add_values(
             (
@@ -566,7 +1328,7 @@ class ICM20649(ICM20X):
                 ("RANGE_4000_DPS", 3, 4000, 8.2),
             )
         )
-        super().__init__(i2c_bus, address)
+        super().__init__(i2c_bus, address, warm_start=warm_start)
 
 
 # https://www.y-ic.es/datasheet/78/SMDSW.020-2OZ.pdf page 19
@@ -595,6 +1357,8 @@ class ICM20948(ICM20X):  # pylint:disable=too-many-instance-attributes
 
     :param ~busio.I2C i2c_bus: The I2C bus the ICM20948 is connected to.
     :param int address: The I2C address of the device. Defaults to :const:`0x69`
+    :param bool warm_start: Skip the reset and configuration if the sensor and magnetometer are
+        already running with the default configuration. Defaults to :const:`False`
 
     **Quickstart: Importing and using the ICM20948 temperature sensor**
 
@@ -631,15 +1395,14 @@ class ICM20948(ICM20X):  # pylint:disable=too-many-instance-attributes
     # mag data is LE
     _raw_mag_data = Struct(_ICM20948_EXT_SLV_SENS_DATA_00, "<hhhh")
 
+    # the SLV0 readout of the magnetometer follows the temperature data
+    _burst_length = 22
+
     _bypass_i2c_master = RWBit(_ICM20X_REG_INT_PIN_CFG, 1)
-    _i2c_master_control = UnaryStruct(_ICM20X_I2C_MST_CTRL, ">B")
     _i2c_master_enable = RWBit(_ICM20X_USER_CTRL, 5)  # TODO: use this in sw reset
     _i2c_master_reset = RWBit(_ICM20X_USER_CTRL, 1)
 
-    _slave0_addr = UnaryStruct(_ICM20X_I2C_SLV0_ADDR, ">B")
-    _slave0_reg = UnaryStruct(_ICM20X_I2C_SLV0_REG, ">B")
-    _slave0_ctrl = UnaryStruct(_ICM20X_I2C_SLV0_CTRL, ">B")
-    _slave0_do = UnaryStruct(_ICM20X_I2C_SLV0_DO, ">B")
+    # the I2C master and SLV0 configuration live in the bank 3 shadow
 
     _slave4_addr = UnaryStruct(_ICM20X_I2C_SLV4_ADDR, ">B")
     _slave4_reg = UnaryStruct(_ICM20X_I2C_SLV4_REG, ">B")
@@ -647,7 +1410,7 @@ class ICM20948(ICM20X):  # pylint:disable=too-many-instance-attributes
     _slave4_do = UnaryStruct(_ICM20X_I2C_SLV4_DO, ">B")
     _slave4_di = UnaryStruct(_ICM20X_I2C_SLV4_DI, ">B")
 
-    def __init__(self, i2c_bus, address=_ICM20948_DEFAULT_ADDRESS):
+    def __init__(self, i2c_bus, address=_ICM20948_DEFAULT_ADDRESS, *, warm_start=False):
         AccelRange.add_values(
             (
                 ("RANGE_2G", 0, 2, 16384),
@@ -676,8 +1439,14 @@ class ICM20948(ICM20X):  # pylint:disable=too-many-instance-attributes
                 ("RATE_100HZ", 0x8, 100, None),
             )
         )
-        super().__init__(i2c_bus, address)
-        self._magnetometer_init()
+        # AK09916 register writes waiting to go out over SLV4, oldest first
+        self._mag_queue = []
+        self._mag_busy = False
+        self._mag_transaction_start = 0
+        self._cached_mag_rate = MagDataRate.SHUTDOWN  # pylint: disable=no-member
+        super().__init__(i2c_bus, address, warm_start=warm_start)
+        if not self.warm_started:
+            self._magnetometer_init()
 
     # A million thanks to the SparkFun folks for their library that I pillaged to write this method!
     # See their Python library here:
@@ -694,6 +1463,23 @@ class ICM20948(ICM20X):  # pylint:disable=too-many-instance-attributes
             # i2c microcontroller stuck, try resetting
         return False
 
+    def _warm_start(self):
+        if not super()._warm_start():
+            return False
+        # the magnetometer is running if the continuous SLV0 readout is still set up
+        self._bank = 0
+        if not self._i2c_master_enable:
+            return False
+        shadow = self._config_shadow[3]
+        if (
+            shadow[_ICM20X_I2C_SLV0_ADDR],
+            shadow[_ICM20X_I2C_SLV0_REG],
+            shadow[_ICM20X_I2C_SLV0_CTRL],
+        ) != (0x8C, 0x11, 0x89):
+            return False
+        self._cached_mag_rate = MagDataRate.RATE_100HZ  # pylint: disable=no-member
+        return True
+
     def _reset_i2c_master(self):
         self._bank = 0
         self._i2c_master_reset = True
@@ -701,26 +1487,21 @@ class ICM20948(ICM20X):  # pylint:disable=too-many-instance-attributes
     def _magnetometer_enable(self):
 
         self._bank = 0
-        sleep(0.100)
         self._bypass_i2c_master = False
-        sleep(0.005)
 
         # no repeated start, i2c microcontroller clock = 345.60kHz
-        self._bank = 3
-        sleep(0.100)
-        self._i2c_master_control = 0x17
-        sleep(0.100)
+        self._set_config_register(3, _ICM20X_I2C_MST_CTRL, 0x17)
 
         self._bank = 0
-        sleep(0.100)
         self._i2c_master_enable = True
-        sleep(0.020)
+        self._settle(_ICM20X_I2C_MASTER_SETTLE)
 
     def _magnetometer_init(self):
         self._magnetometer_enable()
         self.magnetometer_data_rate = (
             MagDataRate.RATE_100HZ  # pylint: disable=no-member
         )
+        self._flush_magnetometer()
 
         if not self._mag_configured:
             return False
@@ -731,36 +1512,81 @@ class ICM20948(ICM20X):  # pylint:disable=too-many-instance-attributes
 
     # set up slave0 for reading into the bank 0 data registers
     def _setup_mag_readout(self):
-        self._bank = 3
-        self._slave0_addr = 0x8C
-        sleep(0.005)
-        self._slave0_reg = 0x11
-        sleep(0.005)
-        self._slave0_ctrl = 0x89  # enable
-        sleep(0.005)
+        with self._batch:
+            self._set_config_register(3, _ICM20X_I2C_SLV0_ADDR, 0x8C)
+            self._set_config_register(3, _ICM20X_I2C_SLV0_REG, 0x11)
+            self._set_config_register(3, _ICM20X_I2C_SLV0_CTRL, 0x89)  # enable
 
     def _mag_id(self):
         return self._read_mag_register(0x01)
 
     @property
     def magnetic(self):
-        """The current magnetic field strengths onthe X, Y, and Z axes in uT (micro-teslas)"""
+        """The current magnetic field strengths onthe X, Y, and Z axes in uT (micro-teslas),
+        along the same axes as :attr:`acceleration` and :attr:`gyro`"""
 
+        if self._mag_busy:
+            self._service_magnetometer()
         self._bank = 0
+        self._wait_settled()
+        if self.timestamp_reads:
+            self.last_read_ns = monotonic_ns()
         full_data = self._raw_mag_data
-        sleep(0.005)
 
+        # the AK09916's Y and Z axes point the opposite way to the accel and gyro axes, so
+        # every magnetic reading is turned into the accel/gyro frame as (x, -y, -z)
         x = full_data[0] * _ICM20X_UT_PER_LSB
-        y = full_data[1] * _ICM20X_UT_PER_LSB
-        z = full_data[2] * _ICM20X_UT_PER_LSB
+        y = -full_data[1] * _ICM20X_UT_PER_LSB
+        z = -full_data[2] * _ICM20X_UT_PER_LSB
 
         return (x, y, z)
 
+    def magnetic_into(self, buf):
+        """Fills ``buf[0:3]`` with the x, y, z magnetic field in uT, like :attr:`magnetic` but
+        without allocating a tuple. ``buf`` is typically an ``array('f')`` reused for every
+        read. Returns ``buf``."""
+        if self._mag_busy:
+            self._service_magnetometer()
+        data = self._read_axes(_ICM20948_EXT_SLV_SENS_DATA_00)
+        # mag data is LE, in the accel/gyro frame as in magnetic
+        buf[0] = _be_int16(data[1], data[0]) * _ICM20X_UT_PER_LSB
+        buf[1] = -_be_int16(data[3], data[2]) * _ICM20X_UT_PER_LSB
+        buf[2] = -_be_int16(data[5], data[4]) * _ICM20X_UT_PER_LSB
+        return buf
+
+    def _prepare_read(self):
+        if self._mag_busy:
+            self._service_magnetometer()
+        super()._prepare_read()
+
+    def _decode_burst(self, buffer):
+        acceleration, gyro, temperature = super()._decode_burst(buffer)
+        raw_mag = unpack_from("<hhh", buffer, 14)
+        # (x, -y, -z) into the accel/gyro frame, see magnetic
+        magnetic = (
+            raw_mag[0] * _ICM20X_UT_PER_LSB,
+            -raw_mag[1] * _ICM20X_UT_PER_LSB,
+            -raw_mag[2] * _ICM20X_UT_PER_LSB,
+        )
+        return (acceleration, gyro, temperature, magnetic)
+
+    def read_all(self):
+        """Reads every sensor in a single I2C transaction so that all of the values come from
+        the same sampling instant. Returns ``(acceleration, gyro, temperature, magnetic)`` in
+        the same units as :attr:`acceleration`, :attr:`gyro`, :attr:`temperature` and
+        :attr:`magnetic`"""
+        if self._mag_busy:
+            self._service_magnetometer()
+        return self._decode_burst(self._read_burst())
+
     @property
     def magnetometer_data_rate(self):
-        """The rate at which the magnetometer takes measurements to update its output registers"""
-        # read mag DR register
-        self._read_mag_register(_AK09916_CNTL2)
+        """The rate at which the magnetometer takes measurements to update its output registers.
+
+        Changing the rate does not block: the AK09916 register writes are queued and sent over
+        the ICM20948's auxiliary I2C bus one per read of :attr:`magnetic`, :meth:`magnetic_into`
+        or :meth:`read_all`, while the continuous readout keeps delivering samples."""
+        return self._cached_mag_rate
 
     @magnetometer_data_rate.setter
     def magnetometer_data_rate(self, mag_rate):
@@ -769,64 +1595,177 @@ class ICM20948(ICM20X):  # pylint:disable=too-many-instance-attributes
         # "When user wants to change operation mode, transit to Power-down mode first and then
         # transit to other modes. After Power-down mode is set, at least 100 microsectons (Twait)
         # is needed before setting another mode"
+        # SLV4 transactions run at most once per sample period, so queueing the two writes
+        # back to back always leaves at least Twait between them
         if not MagDataRate.is_valid(mag_rate):
             raise AttributeError("range must be an `MagDataRate`")
-        self._write_mag_register(
-            _AK09916_CNTL2, MagDataRate.SHUTDOWN  # pylint: disable=no-member
+        self._mag_queue.append(
+            (_AK09916_CNTL2, MagDataRate.SHUTDOWN)  # pylint: disable=no-member
+        )
+        self._mag_queue.append((_AK09916_CNTL2, mag_rate))
+        self._cached_mag_rate = mag_rate
+        self._service_magnetometer()
+
+    def _service_magnetometer(self):
+        """Advances the queued AK09916 register writes by at most one step without blocking"""
+        if self._mag_busy:
+            if self._poll_mag_transaction() is False:
+                return
+            # finished or timed out, either way the SLV4 channel is free again
+            self._mag_busy = False
+        if self._mag_queue:
+            register_addr, value = self._mag_queue.pop(0)
+            self._start_mag_transaction(register_addr, value)
+            self._mag_busy = True
+
+    def _flush_magnetometer(self):
+        """Blocks until every queued AK09916 register write has been sent"""
+        while self._mag_busy or self._mag_queue:
+            self._service_magnetometer()
+            if self._mag_busy:
+                sleep(_ICM20X_POLL_INTERVAL)
+
+    def _mag_transaction_timeout(self):
+        # the I2C master runs at the gyro data rate, 1100 / (1 + divisor) Hz
+        return (
+            _AK09916_TRANSACTION_SAMPLES * (1 + self.gyro_data_rate_divisor) * 1000000000 // 1100
         )
-        sleep(0.001)
-        self._write_mag_register(_AK09916_CNTL2, mag_rate)
 
-    def _read_mag_register(self, register_addr, slave_addr=0x0C):
+    def _start_mag_transaction(self, register_addr, value=None, slave_addr=0x0C):
+        """Starts a single SLV4 read (``value`` of ``None``) or write of an AK09916 register"""
+        self._wait_settled()
         self._bank = 3
 
-        slave_addr |= 0x80  # set top bit for read
-
+        if value is None:
+            slave_addr |= 0x80  # set top bit for read
         self._slave4_addr = slave_addr
-        sleep(0.005)
         self._slave4_reg = register_addr
-        sleep(0.005)
+        if value is not None:
+            self._slave4_do = value
         self._slave4_ctrl = (
             0x80  # enable, don't raise interrupt, write register value, no delay
         )
-        sleep(0.005)
         self._bank = 0
+        self._mag_transaction_start = monotonic_ns()
+
+    def _poll_mag_transaction(self):
+        """Returns ``True`` once the SLV4 transaction is done, ``False`` while it is in flight
+        and ``None`` if it took longer than a few I2C master cycles"""
+        self._bank = 0
+        if self._slave_finished:  # bueno! :)
+            return True
+        if monotonic_ns() - self._mag_transaction_start > self._mag_transaction_timeout():
+            return None
+        return False
 
-        finished = False
-        for _i in range(100):
-            finished = self._slave_finished
-            if finished:  # bueno! :)
-                break
-            sleep(0.010)
+    def _finish_mag_transaction(self):
+        while True:
+            finished = self._poll_mag_transaction()
+            if finished is not False:
+                return bool(finished)
+            sleep(_ICM20X_POLL_INTERVAL)
 
-        if not finished:
+    def _read_mag_register(self, register_addr, slave_addr=0x0C):
+        self._flush_magnetometer()
+        self._start_mag_transaction(register_addr, slave_addr=slave_addr)
+        if not self._finish_mag_transaction():
             return None
 
         self._bank = 3
         mag_register_data = self._slave4_di
-        sleep(0.005)
         return mag_register_data
 
     def _write_mag_register(self, register_addr, value, slave_addr=0x0C):
-        self._bank = 3
+        self._flush_magnetometer()
+        self._start_mag_transaction(register_addr, value, slave_addr)
+        return self._finish_mag_transaction()
 
-        self._slave4_addr = slave_addr
-        sleep(0.005)
-        self._slave4_reg = register_addr
-        sleep(0.005)
-        self._slave4_do = value
-        sleep(0.005)
-        self._slave4_ctrl = (
-            0x80  # enable, don't raise interrupt, write register value, no delay
-        )
-        sleep(0.005)
-        self._bank = 0
 
-        finished = False
-        for _i in range(100):
-            finished = self._slave_finished
-            if finished:  # bueno! :)
-                break
-            sleep(0.010)
+class ICM20XGroup:
+    """Reads several ICM20X sensors on one shared I2C bus together. Each tick takes the bus
+    lock once and reads every sensor back-to-back, so the readings are as close in time as
+    the bus allows and a second sensor adds only its own data transaction.
+
+    :param sensors: The `ICM20649` and `ICM20948` instances to read, all on the same bus
+
+    **Quickstart: Importing and using the group**
+
+        .. code-block:: python
+
+            import board
+            from adafruit_icm20x import ICM20948, ICM20XGroup
+
+            i2c = board.I2C()  # uses board.SCL and board.SDA
+            group = ICM20XGroup(ICM20948(i2c, 0x68), ICM20948(i2c, 0x69))
+
+            for acceleration, gyro, temperature, magnetic in group.read_all():
+                print(gyro)
+
+    """
 
-        return finished
+    def __init__(self, *sensors):
+        if not sensors:
+            raise AttributeError("an ICM20XGroup needs at least one sensor")
+        i2c = sensors[0].i2c_device.i2c
+        for sensor in sensors:
+            if sensor.i2c_device.i2c is not i2c:
+                raise AttributeError("every sensor in an ICM20XGroup must share one I2C bus")
+        self.sensors = sensors
+        self._i2c = i2c
+        self._bank_cmd = bytearray((_ICM20X_REG_BANK_SEL, 0))
+        # set to record ``time.monotonic_ns()`` in :attr:`last_read_ns` as every read takes the
+        # bus, each sensor's own ``timestamp_reads`` still decides its ``last_read_ns``
+        self.timestamp_reads = False
+        self.last_read_ns = 0
+
+    def __len__(self):
+        return len(self.sensors)
+
+    def _read_each(self, burst):
+        """Reads every sensor's burst or gyro registers into its own buffer under one lock"""
+        for sensor in self.sensors:
+            sensor._prepare_read()  # pylint:disable=protected-access
+        i2c = self._i2c
+        while not i2c.try_lock():
+            pass
+        try:
+            if self.timestamp_reads:
+                self.last_read_ns = monotonic_ns()
+            # pylint:disable=protected-access
+            for sensor in self.sensors:
+                device = sensor.i2c_device
+                if sensor._cached_bank != 0:
+                    sensor._cached_bank = None
+                    device.write(self._bank_cmd)
+                    sensor._cached_bank = 0
+                if sensor.timestamp_reads:
+                    sensor.last_read_ns = monotonic_ns()
+                if burst:
+                    device.write_then_readinto(sensor._burst_cmd, sensor._burst_buffer)
+                else:
+                    sensor._axes_cmd[0] = _ICM20X_GYRO_XOUT_H
+                    device.write_then_readinto(sensor._axes_cmd, sensor._axes_buffer)
+        finally:
+            i2c.unlock()
+
+    def read_all(self):
+        """Reads every sensor in one go. Returns a tuple with each sensor's
+        :meth:`ICM20X.read_all` result, in the order the sensors were given"""
+        self._read_each(True)
+        # pylint:disable=protected-access
+        return tuple(sensor._decode_burst(sensor._burst_buffer) for sensor in self.sensors)
+
+    def gyro_into(self, buf):
+        """Fills ``buf`` with the x, y, z angular velocity in radians / second of each sensor
+        in turn, like :meth:`ICM20X.gyro_into` but reading only the gyros of every sensor in
+        one go. ``buf`` needs three items per sensor. Returns ``buf``."""
+        self._read_each(False)
+        index = 0
+        for sensor in self.sensors:
+            data = sensor._axes_buffer  # pylint:disable=protected-access
+            scale = sensor._gyro_scale  # pylint:disable=protected-access
+            buf[index] = _be_int16(data[0], data[1]) * scale
+            buf[index + 1] = _be_int16(data[2], data[3]) * scale
+            buf[index + 2] = _be_int16(data[4], data[5]) * scale
+            index += 3
+        return buf
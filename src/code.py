@@ -1,20 +1,54 @@
 from __future__ import annotations
 
+import math
 import time
+from array import array
 import board
 import digitalio
 import keypad
 import pwmio
+import supervisor
 
 WARN_AFTER_OPEN = 1 / 3  # minutes
 SAMPLE_INDEX = 0  # x on the sparkfun icm-20648 board
+ICM_ADDRESSES = (0x69,)  # add 0x68 for doors with a second ICM, their gyros are averaged
 LOOP_SLEEP_TIME = 0.01  # seconds
+USE_FIFO = False  # drain hardware-timed gyro samples in batches instead of polling
+USE_SAMPLE_BUFFER = True  # read the gyro into one reused buffer instead of a new tuple
+USE_FIXED_POINT = False  # integrate raw counts over integer ticks, no floats per sample
+ICM_INTERRUPT_PIN = None  # name of the board pin wired to the ICM's INT pin, None to poll
+IDLE_WAKE_TIME = 0.25  # seconds, longest light sleep while waiting on the INT pin
+USE_LOW_POWER = False  # duty cycle the ICM while the door is shut, waking it on motion
+LOW_POWER_AFTER = 10  # seconds the door has to be shut and still first
+LOW_POWER_RATE = 10  # Hz, how often the sleeping ICM checks for motion
+WAKE_ON_MOTION_THRESHOLD = 20  # milli-g between samples that counts as the door moving
 USE_BLUETOOTH = True
-DRIFT_THRESH = 0.1
+USE_FUSION = False  # correct the gyro's drift with the magnetometer, on the first ICM only
+FUSION_TIME_CONSTANT = 2.0  # seconds the gyro is trusted over the magnetometer
+USE_AHRS = False  # track the full orientation, for sensors not mounted square to the hinge
+AHRS_BETA = 0.1  # radians/second, how hard gravity and the field correct the gyro
+USE_STILLNESS = True  # re-zero the angle and gyro bias while the door rests shut
+STILL_WINDOW = 100  # samples the gyro's spread is measured over
+STILL_GYRO_NOISE = 0.01  # radians/second, the gyro's standard deviation at rest
+STILL_ACCELERATION_NOISE = 0.05  # m/s^2, the same for the acceleration when it is read
+REZERO_AFTER = 5  # seconds of stillness near the closed position before re-zeroing
+STILL_MAX_BIAS = 0.05  # radians/second, a larger mean is a slow swing, not bias
+DRIFT_THRESH = 0.03  # radians/second, only has to cover noise once the gyro is calibrated
+AUTO_DRIFT = True  # size the dead-band from the gyro's noise, DRIFT_THRESH becomes its ceiling
+DRIFT_NOISE_WINDOW = 200  # samples the noise is measured over while the door is shut
+DRIFT_NOISE_MULTIPLE = 4.0  # the dead-band in standard deviations of the noise
+INTEGRATOR = "trapezoid"  # "euler", "trapezoid" or "simpson", how the gyro is integrated
+GYRO_CALIBRATION_SAMPLES = 100
+GYRO_CALIBRATION_MAX_DEVIATION = 0.02  # radians/second, above this the door was moving
 PRINT_USART_EVERY = 4  # seconds
+TRACE_BUS = False  # count I2C traffic and driver sleeps, reported with the status print
 
 DOOR_CLOSED_THRESH = 0.3  # radians
 DOOR_OPENED_THRESH = 0.35  # radians
+# events are debounced with dwell times and swing speed, never blocking
+MIN_DWELL = 0.25  # seconds a slow crossing has to hold, and between events, 0 for no debounce
+GATE_RATE = 0.5  # radians/second, a swing this fast through a threshold counts at once
+EVENT_QUEUE_SIZE = 16  # door events held until the loop gets to them, the oldest are dropped
 
 
 # constatnts
@@ -34,11 +68,16 @@ from adafruit_ble.advertising.standard import ProvideServicesAdvertisement
 from adafruit_ble.services.nordic import UARTService
 
 # perispheral imports
-from adafruit_icm20x import ICM20948
+from adafruit_icm20x import ICM20948, ICM20XGroup
 
 # our imports
-from scad.open_close import OpenCloseDetector
+from scad.open_close import OpenCloseDetector, FixedPointOpenCloseDetector
+from scad.fused import FusedOpenCloseDetector
+from scad.ahrs import MadgwickAHRS
 from scad.tracker import DoorTimeTracker
+from scad.stillness import StillnessDetector
+from scad.door_state import DoorStateMachine
+from scad.events import EventQueue
 
 # --- init BLE and prepare the adverisement type for later ---
 ble = BLERadio()
@@ -75,24 +114,237 @@ led.switch_to_output()
 
 # --- setup peripherals ---
 i2c = board.I2C()
-icm = ICM20948(i2c, address=0x69)
+# after a watchdog reset or deep sleep wake, keep the sensor's running configuration
+icms = [ICM20948(i2c, address=address, warm_start=True) for address in ICM_ADDRESSES]
+icm = icms[0]  # the FIFO, INT pin and wake on motion are only used on the first
+# several sensors are read back-to-back under one bus lock
+icm_group = ICM20XGroup(*icms) if len(icms) > 1 else None
+if USE_FIFO and USE_AHRS:
+    # the FIFO only logs the gyro, the AHRS needs all three vectors with every sample
+    raise ValueError("USE_AHRS needs polled samples, turn off USE_FIFO")
+if USE_FIFO and USE_FIXED_POINT:
+    # the fixed point detector takes one raw sample at a time, it has no batch path
+    raise ValueError("USE_FIXED_POINT needs polled samples, turn off USE_FIFO")
+if USE_FIFO:
+    icm.enable_fifo(acceleration=False, gyro=True)
+    FIFO_SAMPLE_PERIOD = icm.sample_period_ns / 1e9  # seconds
+    # the FIFO holds 512 bytes, drained into one reused buffer and integrated as a batch
+    fifo_samples = array("f", (0.0 for _ in range(512 // icm.fifo_frame_size)))
+
+if ICM_INTERRUPT_PIN is not None:
+    import alarm as power_alarm  # `alarm` is the buzzer
+
+    # data reads clear the latched pin, so re-arming costs no extra transaction
+    icm.configure_interrupt_pin(latched=True, clear_on_any_read=True)
+    if USE_FIFO:
+        icm.fifo_watermark_interrupt = True
+    else:
+        icm.data_ready_interrupt = True
+    icm_alarm = power_alarm.pin.PinAlarm(getattr(board, ICM_INTERRUPT_PIN), value=True)
+else:
+    icm_alarm = None
+
+if TRACE_BUS:
+    from scad.bus_trace import BusTracer
+
+    bus_tracer = BusTracer(icm)
+else:
+    bus_tracer = None
 
 # --- processing ---
 tracker = DoorTimeTracker()
-detector = OpenCloseDetector(
-    # future, link the tracker to the detector with the args below
-    drift_thres=DRIFT_THRESH,
+door_state = DoorStateMachine(
     door_close_thresh=DOOR_CLOSED_THRESH,
     door_open_thresh=DOOR_OPENED_THRESH,
-    debug_output=False,
+    min_dwell=MIN_DWELL,
+    gate_rate=GATE_RATE,
 )
+# every event with its time, angle and speed, the fixed point detector is polled instead
+event_queue = None if USE_FIXED_POINT else EventQueue(EVENT_QUEUE_SIZE)
+if USE_FIXED_POINT:
+    # polls the first ICM's gyro only, without the fusion, AHRS or stillness re-zeroing
+    detector = FixedPointOpenCloseDetector(
+        drift_thres=DRIFT_THRESH,
+        door_close_thresh=DOOR_CLOSED_THRESH,
+        door_open_thresh=DOOR_OPENED_THRESH,
+        gyro_scale=icm.gyro_scale,
+        state_machine=door_state,
+    )
+elif USE_FUSION:
+    detector = FusedOpenCloseDetector(
+        drift_thres=DRIFT_THRESH,
+        door_close_thresh=DOOR_CLOSED_THRESH,
+        door_open_thresh=DOOR_OPENED_THRESH,
+        debug_output=False,
+        integrator=INTEGRATOR,
+        auto_drift=AUTO_DRIFT,
+        noise_window=DRIFT_NOISE_WINDOW,
+        noise_multiple=DRIFT_NOISE_MULTIPLE,
+        state_machine=door_state,
+        event_queue=event_queue,
+        axis=SAMPLE_INDEX,
+        time_constant=FUSION_TIME_CONSTANT,
+    )
+else:
+    detector = OpenCloseDetector(
+        # future, link the tracker to the detector with the args below
+        drift_thres=DRIFT_THRESH,
+        door_close_thresh=DOOR_CLOSED_THRESH,
+        door_open_thresh=DOOR_OPENED_THRESH,
+        debug_output=False,
+        integrator=INTEGRATOR,
+        auto_drift=AUTO_DRIFT,
+        noise_window=DRIFT_NOISE_WINDOW,
+        noise_multiple=DRIFT_NOISE_MULTIPLE,
+        state_machine=door_state,
+        event_queue=event_queue,
+    )
+# with the AHRS the detector is only used for its thresholds on the hinge angle
+ahrs = MadgwickAHRS(beta=AHRS_BETA) if USE_AHRS else None
+# these need the accelerometer and magnetometer too, read in the same burst as the gyro
+READ_ALL = USE_FUSION or USE_AHRS
+# the AHRS keeps its own angle, so there is nothing to re-zero
+if USE_STILLNESS and not (USE_AHRS or USE_FIXED_POINT):
+    stillness = StillnessDetector(
+        window=STILL_WINDOW,
+        gyro_noise=STILL_GYRO_NOISE,
+        acceleration_noise=STILL_ACCELERATION_NOISE,
+    )
+else:
+    stillness = None
+
+
+# reused for every sample so polling the gyro doesn't churn the heap
+gyro_buffer = array("f", (0.0 for _ in range(3 * len(icms))))
+gyro_raw_buffer = array("h", (0, 0, 0))
+
+
+# supervisor.ticks_ms() at the previous sample, None before the first. The ticks are small
+# ints, so timing the reads with them doesn't allocate like time.monotonic_ns() would
+last_ticks = None
+TICKS_PERIOD = 1 << 29  # supervisor.ticks_ms() wraps around
 
 
 # --- misc functions ---
 def process_sample(now: float, then: float):
-    detector.new_sample(
-        sample=icm.gyro[SAMPLE_INDEX],
-        dt=now - then,
+    global last_ticks
+    if USE_FIFO:
+        count = 0
+        for _accel, gyro, _temp in icm.read_fifo():
+            fifo_samples[count] = gyro[SAMPLE_INDEX]
+            count += 1
+        # every frame is one sample period apart, however late the loop runs, the last
+        # one about when the FIFO was drained
+        detector.time = time.monotonic() - count * FIFO_SAMPLE_PERIOD
+        detector.new_samples(fifo_samples, FIFO_SAMPLE_PERIOD, count=count)
+        if USE_FUSION:
+            # the FIFO only holds the gyro, the field comes from one burst per batch
+            acceleration, _gyro, _temp, magnetic = icm.read_all()
+            detector.correct(magnetic, count * FIFO_SAMPLE_PERIOD, acceleration)
+        for index in range(count):
+            check_stillness(fifo_samples[index], FIFO_SAMPLE_PERIOD)
+        return
+
+    if USE_FIXED_POINT:
+        sample = icm.gyro_raw_into(gyro_raw_buffer)[SAMPLE_INDEX]
+        ticks = supervisor.ticks_ms()
+        if last_ticks is not None:
+            detector.new_sample(sample, (ticks - last_ticks) % TICKS_PERIOD)
+        last_ticks = ticks
+        return
+
+    if READ_ALL:
+        # one burst for everything, so the vectors match the gyro sample
+        acceleration, gyro, _temp, magnetic = icm.read_all()
+        sample = gyro[SAMPLE_INDEX]
+    elif icm_group is not None:
+        icm_group.gyro_into(gyro_buffer)
+        sample = 0.0
+        for index in range(SAMPLE_INDEX, len(gyro_buffer), 3):
+            sample += gyro_buffer[index]
+        sample /= len(icms)
+    elif USE_SAMPLE_BUFFER:
+        sample = icm.gyro_into(gyro_buffer)[SAMPLE_INDEX]
+    else:
+        sample = icm.gyro[SAMPLE_INDEX]
+
+    # time the reads themselves, so BLE writes and prints in the loop don't skew dt
+    ticks = supervisor.ticks_ms()
+    if last_ticks is None:
+        dt = now - then
+        # timestamp the events on the monotonic clock, every sample moves it on by its dt
+        detector.time = time.monotonic() - dt
+    else:
+        dt = ((ticks - last_ticks) % TICKS_PERIOD) / 1000
+    last_ticks = ticks
+    if USE_AHRS:
+        ahrs.update(
+            gyro[0],
+            gyro[1],
+            gyro[2],
+            acceleration[0],
+            acceleration[1],
+            acceleration[2],
+            magnetic[0],
+            magnetic[1],
+            magnetic[2],
+            dt,
+        )
+        detector.set_angle(ahrs.hinge_angle, dt)
+    elif USE_FUSION:
+        detector.new_sample(sample=sample, dt=dt, acceleration=acceleration, magnetic=magnetic)
+    else:
+        detector.new_sample(sample=sample, dt=dt)
+    check_stillness(sample, dt, acceleration if READ_ALL else None)
+
+
+def check_stillness(sample: float, dt: float, acceleration=None):
+    """re-zeroes the detector once the door has rested near shut for REZERO_AFTER seconds"""
+    if stillness is None:
+        return
+    if acceleration is not None:
+        x, y, z = acceleration
+        acceleration = math.sqrt(x * x + y * y + z * z)
+    if not stillness.update(sample, dt, acceleration) or stillness.still_time < REZERO_AFTER:
+        return
+    stillness.still_time = 0.0
+    if detector.door_is_open or abs(detector.angle) >= DOOR_CLOSED_THRESH:
+        return
+    bias = stillness.gyro_bias
+    detector.rezero(gyro_bias=bias if abs(bias) < STILL_MAX_BIAS else None)
+
+
+def next_event() -> None | tuple:
+    """:return: the oldest ``(timestamp, opened, angle, angular_velocity)``, None if none"""
+    if event_queue is None:
+        event = detector.get_event()
+        return None if event is None else (time.monotonic(), event, detector.angle, 0.0)
+    return event_queue.pop()
+
+
+def send_event(timestamp: float, opened: bool, angle: float, angular_velocity: float):
+    msg = (
+        "{\n"
+        + f"""
+            "kind" : "door-event",
+            "is_door_open": {str(opened).lower()},
+            "time_monotonic": {timestamp},
+            "angle": {angle},
+            "angular_velocity": {angular_velocity}\n"""
+        + "}\n"
+    ).replace("    ", " ")
+    if ble.connected:
+        uart.write(msg)
+
+
+def wait_for_sample(period: float = LOOP_SLEEP_TIME):
+    if icm_alarm is None:
+        time.sleep(period)
+        return
+    # wake on the sensor's INT pin, or periodically to service BLE and the button
+    power_alarm.light_sleep_until_alarms(
+        icm_alarm,
+        power_alarm.time.TimeAlarm(monotonic_time=time.monotonic() + IDLE_WAKE_TIME),
     )
 
 
@@ -104,12 +356,32 @@ def readline():
 
 
 def calibrate():
+    global last_activity
     print("please close the door, the device will calibrate itself in 5 seconds...")
     for left in range(5, 1, -1):
         print(f"{left}...")
         time.sleep(1)
     else:
+        # the gyro is off in low power, and the button can be pressed at any time
+        for sensor in icms:
+            sensor.exit_low_power()
+        last_activity = time.monotonic()
+        for sensor in icms:
+            try:
+                bias, _ = sensor.calibrate_gyro(
+                    GYRO_CALIBRATION_SAMPLES, max_deviation=GYRO_CALIBRATION_MAX_DEVIATION
+                )
+                print(f"gyro bias {bias} rad/s written to the sensor")
+            except RuntimeError as error:
+                # the door moved, or the gyro wasn't sampling
+                print(f"{error}, keeping the previous gyro calibration")
         detector.calibrate()
+        if ahrs is not None:
+            acceleration, _gyro, _temp, magnetic = icm.read_all()
+            ahrs.align(*acceleration, *magnetic)
+            # open the same way as the gyro axis, up or down, so the thresholds keep their sign
+            ahrs.hinge_direction = 1.0 if acceleration[SAMPLE_INDEX] >= 0 else -1.0
+            ahrs.calibrate()
         tracker.calibrate()
         silence_the_alarm()
 
@@ -139,7 +411,7 @@ def wait_for_connection(run_samples: bool = True):
 
         # refresh the angle measurment
         if run_samples:
-            detector.new_sample(sample=icm.gyro[SAMPLE_INDEX], dt=now - last_loop)
+            process_sample(now=now, then=last_loop)
             last_loop = now
 
         # print status every second
@@ -182,12 +454,18 @@ def poll_usart_print(now: float | None = None):
                 "unattended_count": {tracker.open_too_long_count},
                 "is_unattended": {tracker.is_open_too_long},
                 "open_count": {tracker.open_count},
-                "is_door_open": {str(tracker.door_open).lower()}\n"""
+                "is_door_open": {str(tracker.door_open).lower()},
+                "event_overflow": {0 if event_queue is None else event_queue.overflow}\n"""
             + "}\n"
         ).replace("    ", " ")
         print(msg)
         if ble.connected:
             uart.write(msg)
+            if ahrs is not None:
+                uart.write(ahrs.quaternion_packet().to_bytes())
+        if bus_tracer is not None:
+            print("bus trace:", bus_tracer.summary())
+            bus_tracer.reset()
 
 
 globals = locals()
@@ -233,10 +511,43 @@ def main():
 
 
 last_time = time.monotonic()
+last_activity = last_time
+
+
+def manage_power(now: float) -> bool:
+    """
+    Puts the ICM into low power once the door has been shut and still for a while, and
+    brings it back when it sees motion.
+    :return: True if the ICM is asleep and there are no samples to process
+    """
+    global last_activity
+    if not USE_LOW_POWER:
+        return False
+
+    if icm.low_power:
+        if not icm.check_motion_wake():
+            return True
+        print("motion, back to full rate")
+        for sensor in icms[1:]:
+            sensor.exit_low_power()
+        if USE_FIFO:
+            icm.reset_fifo()  # drop the frames logged with the gyro off
+        last_activity = now
+        return False
+
+    if tracker.door_open or abs(detector.angle) >= DOOR_CLOSED_THRESH:
+        last_activity = now
+    elif now - last_activity > LOW_POWER_AFTER:
+        print("door shut and still, entering low power")
+        icm.enter_low_power(LOW_POWER_RATE, wake_threshold=WAKE_ON_MOTION_THRESHOLD)
+        for sensor in icms[1:]:
+            sensor.enter_low_power(LOW_POWER_RATE)
+        return True
+    return False
 
 
 def main_loop():
-    global last_time
+    global last_time, last_activity, last_ticks
     now = time.monotonic()
 
     check_for_button_press()
@@ -254,23 +565,39 @@ def main_loop():
 
     poll_usart_print(now)
 
-    process_sample(then=last_time, now=now)
-    event = detector.get_event()
+    if manage_power(now):
+        # nothing to integrate, and the next dt starts from here
+        last_time = now
+        last_ticks = None
+        wait_for_sample(1 / LOW_POWER_RATE)
+        return
+
+    if bus_tracer is None:
+        process_sample(then=last_time, now=now)
+    else:
+        with bus_tracer.section("process_sample"):
+            process_sample(then=last_time, now=now)
+    record = next_event()
 
-    # then an door is open
-    if event is True:
-        tracker.door_opened()
     # check if the door is open for too long
-    elif event is False:
-        silence_the_alarm()
-        tracker.door_closed()
-    elif tracker.door_open and tracker.open_too_long(now):
+    if record is None and tracker.door_open and tracker.open_too_long(now):
         sound_the_alarm()
-    else:
-        pass
+
+    # work through every event since the last loop, in order
+    while record is not None:
+        last_activity = now
+        timestamp, opened, angle, angular_velocity = record
+        # then an door is open
+        if opened:
+            tracker.door_opened(timestamp)
+        else:
+            silence_the_alarm()
+            tracker.door_closed()
+        send_event(timestamp, opened, angle, angular_velocity)
+        record = next_event()
 
     last_time = now
-    time.sleep(LOOP_SLEEP_TIME)
+    wait_for_sample()
 
 
 if __name__ == "__main__":
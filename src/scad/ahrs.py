@@ -0,0 +1,471 @@
+from __future__ import annotations
+
+import math
+
+try:  # adding types can make the code more readable, but circuitpython doesn't support it
+    from typing import *
+except ImportError:
+    pass
+
+
+class _AHRS:
+    """
+    The orientation shared by the filters: a unit quaternion ``(w, x, y, z)`` rotating the
+    sensor's frame into the earth's, where x is magnetic north, y is west and z is up. The
+    gyro, accelerometer and magnetometer vectors all have to be along the same axes, as the
+    ICM20948 driver gives them.
+
+    The update loops only keep floats in attributes and locals, so they don't allocate.
+    """
+
+    def __init__(self, *, hinge_direction: float = 1.0) -> None:
+        """
+        :param hinge_direction: 1 if the door opens anticlockwise seen from above, -1 if not
+        """
+        self.hinge_direction = hinge_direction
+        self.w: float = 1.0
+        self.x: float = 0.0
+        self.y: float = 0.0
+        self.z: float = 0.0
+        # the orientation of the closed door
+        self.reference_w: float = 1.0
+        self.reference_x: float = 0.0
+        self.reference_y: float = 0.0
+        self.reference_z: float = 0.0
+
+    def align(self, ax: float, ay: float, az: float, mx: float, my: float, mz: float) -> None:
+        """Jumps straight to the orientation given by gravity and the magnetic field, so the
+        filter doesn't spend its first seconds converging"""
+        up = _unit(ax, ay, az)
+        if up is None:
+            return
+        ux, uy, uz = up
+        west = _unit(uy * mz - uz * my, uz * mx - ux * mz, ux * my - uy * mx)
+        if west is None:
+            return
+        wx, wy, wz = west
+        nx, ny, nz = wy * uz - wz * uy, wz * ux - wx * uz, wx * uy - wy * ux
+
+        # the rows of the rotation matrix are north, west and up in the sensor's frame
+        trace = nx + wy + uz
+        if trace > 0:
+            s = 0.5 / math.sqrt(trace + 1.0)
+            self.w = 0.25 / s
+            self.x = (uy - wz) * s
+            self.y = (nz - ux) * s
+            self.z = (wx - ny) * s
+        elif nx > wy and nx > uz:
+            s = 2.0 * math.sqrt(1.0 + nx - wy - uz)
+            self.w = (uy - wz) / s
+            self.x = 0.25 * s
+            self.y = (ny + wx) / s
+            self.z = (nz + ux) / s
+        elif wy > uz:
+            s = 2.0 * math.sqrt(1.0 + wy - nx - uz)
+            self.w = (nz - ux) / s
+            self.x = (ny + wx) / s
+            self.y = 0.25 * s
+            self.z = (wz + uy) / s
+        else:
+            s = 2.0 * math.sqrt(1.0 + uz - nx - wy)
+            self.w = (wx - ny) / s
+            self.x = (nz + ux) / s
+            self.y = (wz + uy) / s
+            self.z = 0.25 * s
+        self._normalize()
+
+    def calibrate(self) -> None:
+        """Takes the current orientation as the closed door"""
+        self.reference_w = self.w
+        self.reference_x = self.x
+        self.reference_y = self.y
+        self.reference_z = self.z
+
+    @property
+    def hinge_angle(self) -> float:
+        """
+        radians, how far the door has turned about the vertical since :meth:`calibrate`,
+        from -pi to pi. Only the twist about the vertical counts, so however the sensor is
+        mounted on the door it reads the door's angle.
+        """
+        # the relative rotation, current * conjugate(reference), only its w and z are needed
+        rw = (
+            self.w * self.reference_w
+            + self.x * self.reference_x
+            + self.y * self.reference_y
+            + self.z * self.reference_z
+        )
+        rz = (
+            -self.w * self.reference_z
+            - self.x * self.reference_y
+            + self.y * self.reference_x
+            + self.z * self.reference_w
+        )
+        if rw < 0:
+            rw = -rw
+            rz = -rz
+        return self.hinge_direction * 2.0 * math.atan2(rz, rw)
+
+    @property
+    def quaternion(self) -> tuple[float, float, float, float]:
+        """``(w, x, y, z)``"""
+        return (self.w, self.x, self.y, self.z)
+
+    def quaternion_packet(self):
+        """The orientation as an ``adafruit_bluefruit_connect`` QuaternionPacket"""
+        from adafruit_bluefruit_connect.quaternion_packet import QuaternionPacket
+
+        return QuaternionPacket(self.x, self.y, self.z, self.w)
+
+    def _normalize(self) -> None:
+        norm = math.sqrt(self.w * self.w + self.x * self.x + self.y * self.y + self.z * self.z)
+        if norm == 0.0:
+            self.w = 1.0
+            return
+        self.w /= norm
+        self.x /= norm
+        self.y /= norm
+        self.z /= norm
+
+
+def _unit(x: float, y: float, z: float) -> tuple[float, float, float] | None:
+    norm = math.sqrt(x * x + y * y + z * z)
+    if norm == 0.0:
+        return None
+    return (x / norm, y / norm, z / norm)
+
+
+class MadgwickAHRS(_AHRS):
+    """
+    Madgwick's gradient descent orientation filter. Each update turns the quaternion by the
+    gyro, then steps it down the gradient of the error between where gravity and the
+    magnetic field are and where the quaternion says they should be.
+    """
+
+    def __init__(self, *, beta: float = 0.1, hinge_direction: float = 1.0) -> None:
+        """
+        :param beta: radians/second, how hard the accelerometer and magnetometer pull. Higher
+            corrects gyro drift faster but lets more of their noise through.
+        """
+        super().__init__(hinge_direction=hinge_direction)
+        self.beta = beta
+
+    def update(
+        self,
+        gx: float,
+        gy: float,
+        gz: float,
+        ax: float,
+        ay: float,
+        az: float,
+        mx: float,
+        my: float,
+        mz: float,
+        dt: float,
+    ) -> None:
+        """
+        :param gx: radians/second, and gy, gz
+        :param ax: any unit, and ay, az
+        :param mx: any unit, along the accelerometer's axes, and my, mz. All zero falls back
+            to :meth:`update_imu`
+        :param dt: seconds since the previous update
+        """
+        if mx == 0.0 and my == 0.0 and mz == 0.0:
+            self.update_imu(gx, gy, gz, ax, ay, az, dt)
+            return
+        q0 = self.w
+        q1 = self.x
+        q2 = self.y
+        q3 = self.z
+
+        # rate of change of the quaternion from the gyro
+        dq0 = 0.5 * (-q1 * gx - q2 * gy - q3 * gz)
+        dq1 = 0.5 * (q0 * gx + q2 * gz - q3 * gy)
+        dq2 = 0.5 * (q0 * gy - q1 * gz + q3 * gx)
+        dq3 = 0.5 * (q0 * gz + q1 * gy - q2 * gx)
+
+        norm = math.sqrt(ax * ax + ay * ay + az * az)
+        if norm != 0.0:
+            ax /= norm
+            ay /= norm
+            az /= norm
+            norm = math.sqrt(mx * mx + my * my + mz * mz)
+            mx /= norm
+            my /= norm
+            mz /= norm
+
+            _2q0mx = 2.0 * q0 * mx
+            _2q0my = 2.0 * q0 * my
+            _2q0mz = 2.0 * q0 * mz
+            _2q1mx = 2.0 * q1 * mx
+            _2q0 = 2.0 * q0
+            _2q1 = 2.0 * q1
+            _2q2 = 2.0 * q2
+            _2q3 = 2.0 * q3
+            _2q0q2 = 2.0 * q0 * q2
+            _2q2q3 = 2.0 * q2 * q3
+            q0q0 = q0 * q0
+            q0q1 = q0 * q1
+            q0q2 = q0 * q2
+            q0q3 = q0 * q3
+            q1q1 = q1 * q1
+            q1q2 = q1 * q2
+            q1q3 = q1 * q3
+            q2q2 = q2 * q2
+            q2q3 = q2 * q3
+            q3q3 = q3 * q3
+
+            # the earth's field as the quaternion sees it, north and vertical parts only
+            hx = (
+                mx * q0q0
+                - _2q0my * q3
+                + _2q0mz * q2
+                + mx * q1q1
+                + _2q1 * my * q2
+                + _2q1 * mz * q3
+                - mx * q2q2
+                - mx * q3q3
+            )
+            hy = (
+                _2q0mx * q3
+                + my * q0q0
+                - _2q0mz * q1
+                + _2q1mx * q2
+                - my * q1q1
+                + my * q2q2
+                + _2q2 * mz * q3
+                - my * q3q3
+            )
+            _2bx = math.sqrt(hx * hx + hy * hy)
+            _2bz = (
+                -_2q0mx * q2
+                + _2q0my * q1
+                + mz * q0q0
+                + _2q1mx * q3
+                - mz * q1q1
+                + _2q2 * my * q3
+                - mz * q2q2
+                + mz * q3q3
+            )
+            _4bx = 2.0 * _2bx
+            _4bz = 2.0 * _2bz
+
+            # the errors the gradient is taken of
+            fax = 2.0 * q1q3 - _2q0q2 - ax
+            fay = 2.0 * q0q1 + _2q2q3 - ay
+            faz = 1.0 - 2.0 * q1q1 - 2.0 * q2q2 - az
+            fmx = _2bx * (0.5 - q2q2 - q3q3) + _2bz * (q1q3 - q0q2) - mx
+            fmy = _2bx * (q1q2 - q0q3) + _2bz * (q0q1 + q2q3) - my
+            fmz = _2bx * (q0q2 + q1q3) + _2bz * (0.5 - q1q1 - q2q2) - mz
+
+            s0 = (
+                -_2q2 * fax
+                + _2q1 * fay
+                - _2bz * q2 * fmx
+                + (-_2bx * q3 + _2bz * q1) * fmy
+                + _2bx * q2 * fmz
+            )
+            s1 = (
+                _2q3 * fax
+                + _2q0 * fay
+                - 4.0 * q1 * faz
+                + _2bz * q3 * fmx
+                + (_2bx * q2 + _2bz * q0) * fmy
+                + (_2bx * q3 - _4bz * q1) * fmz
+            )
+            s2 = (
+                -_2q0 * fax
+                + _2q3 * fay
+                - 4.0 * q2 * faz
+                + (-_4bx * q2 - _2bz * q0) * fmx
+                + (_2bx * q1 + _2bz * q3) * fmy
+                + (_2bx * q0 - _4bz * q2) * fmz
+            )
+            s3 = (
+                _2q1 * fax
+                + _2q2 * fay
+                + (-_4bx * q3 + _2bz * q1) * fmx
+                + (-_2bx * q0 + _2bz * q2) * fmy
+                + _2bx * q1 * fmz
+            )
+            norm = math.sqrt(s0 * s0 + s1 * s1 + s2 * s2 + s3 * s3)
+            if norm != 0.0:
+                dq0 -= self.beta * s0 / norm
+                dq1 -= self.beta * s1 / norm
+                dq2 -= self.beta * s2 / norm
+                dq3 -= self.beta * s3 / norm
+
+        self.w = q0 + dq0 * dt
+        self.x = q1 + dq1 * dt
+        self.y = q2 + dq2 * dt
+        self.z = q3 + dq3 * dt
+        self._normalize()
+
+    def update_imu(
+        self, gx: float, gy: float, gz: float, ax: float, ay: float, az: float, dt: float
+    ) -> None:
+        """Like :meth:`update` without a magnetometer, the heading then drifts with the gyro"""
+        q0 = self.w
+        q1 = self.x
+        q2 = self.y
+        q3 = self.z
+
+        dq0 = 0.5 * (-q1 * gx - q2 * gy - q3 * gz)
+        dq1 = 0.5 * (q0 * gx + q2 * gz - q3 * gy)
+        dq2 = 0.5 * (q0 * gy - q1 * gz + q3 * gx)
+        dq3 = 0.5 * (q0 * gz + q1 * gy - q2 * gx)
+
+        norm = math.sqrt(ax * ax + ay * ay + az * az)
+        if norm != 0.0:
+            ax /= norm
+            ay /= norm
+            az /= norm
+
+            q0q0 = q0 * q0
+            q1q1 = q1 * q1
+            q2q2 = q2 * q2
+            q3q3 = q3 * q3
+            s0 = 4.0 * q0 * q2q2 + 2.0 * q2 * ax + 4.0 * q0 * q1q1 - 2.0 * q1 * ay
+            s1 = (
+                4.0 * q1 * q3q3
+                - 2.0 * q3 * ax
+                + 4.0 * q0q0 * q1
+                - 2.0 * q0 * ay
+                - 4.0 * q1
+                + 8.0 * q1 * q1q1
+                + 8.0 * q1 * q2q2
+                + 4.0 * q1 * az
+            )
+            s2 = (
+                4.0 * q0q0 * q2
+                + 2.0 * q0 * ax
+                + 4.0 * q2 * q3q3
+                - 2.0 * q3 * ay
+                - 4.0 * q2
+                + 8.0 * q2 * q1q1
+                + 8.0 * q2 * q2q2
+                + 4.0 * q2 * az
+            )
+            s3 = 4.0 * q1q1 * q3 - 2.0 * q1 * ax + 4.0 * q2q2 * q3 - 2.0 * q2 * ay
+            norm = math.sqrt(s0 * s0 + s1 * s1 + s2 * s2 + s3 * s3)
+            if norm != 0.0:
+                dq0 -= self.beta * s0 / norm
+                dq1 -= self.beta * s1 / norm
+                dq2 -= self.beta * s2 / norm
+                dq3 -= self.beta * s3 / norm
+
+        self.w = q0 + dq0 * dt
+        self.x = q1 + dq1 * dt
+        self.y = q2 + dq2 * dt
+        self.z = q3 + dq3 * dt
+        self._normalize()
+
+
+class MahonyAHRS(_AHRS):
+    """
+    Mahony's complementary filter on the rotation group. The error between the measured and
+    expected gravity and magnetic field directions is fed back into the gyro rate through a
+    PI controller, so the integral term also learns the gyro's bias.
+    """
+
+    def __init__(
+        self, *, kp: float = 1.0, ki: float = 0.0, hinge_direction: float = 1.0
+    ) -> None:
+        """
+        :param kp: proportional gain of the correction
+        :param ki: integral gain, above zero the gyro bias is estimated as well
+        """
+        super().__init__(hinge_direction=hinge_direction)
+        self.kp = kp
+        self.ki = ki
+        # radians/second, the integral term, minus the gyro's bias once it has settled
+        self.integral_x: float = 0.0
+        self.integral_y: float = 0.0
+        self.integral_z: float = 0.0
+
+    def update(
+        self,
+        gx: float,
+        gy: float,
+        gz: float,
+        ax: float,
+        ay: float,
+        az: float,
+        mx: float,
+        my: float,
+        mz: float,
+        dt: float,
+    ) -> None:
+        """Takes the same arguments as :meth:`MadgwickAHRS.update`"""
+        q0 = self.w
+        q1 = self.x
+        q2 = self.y
+        q3 = self.z
+
+        norm = math.sqrt(ax * ax + ay * ay + az * az)
+        if norm != 0.0:
+            ax /= norm
+            ay /= norm
+            az /= norm
+
+            q0q0 = q0 * q0
+            q0q1 = q0 * q1
+            q0q2 = q0 * q2
+            q0q3 = q0 * q3
+            q1q1 = q1 * q1
+            q1q2 = q1 * q2
+            q1q3 = q1 * q3
+            q2q2 = q2 * q2
+            q2q3 = q2 * q3
+            q3q3 = q3 * q3
+
+            # error is the cross product of measured and expected gravity ...
+            half_vx = q1q3 - q0q2
+            half_vy = q0q1 + q2q3
+            half_vz = q0q0 - 0.5 + q3q3
+            half_ex = ay * half_vz - az * half_vy
+            half_ey = az * half_vx - ax * half_vz
+            half_ez = ax * half_vy - ay * half_vx
+
+            # ... plus that of the measured and expected field, when there is one
+            norm = math.sqrt(mx * mx + my * my + mz * mz)
+            if norm != 0.0:
+                mx /= norm
+                my /= norm
+                mz /= norm
+                hx = 2.0 * (mx * (0.5 - q2q2 - q3q3) + my * (q1q2 - q0q3) + mz * (q1q3 + q0q2))
+                hy = 2.0 * (mx * (q1q2 + q0q3) + my * (0.5 - q1q1 - q3q3) + mz * (q2q3 - q0q1))
+                bx = math.sqrt(hx * hx + hy * hy)
+                bz = 2.0 * (mx * (q1q3 - q0q2) + my * (q2q3 + q0q1) + mz * (0.5 - q1q1 - q2q2))
+                half_wx = bx * (0.5 - q2q2 - q3q3) + bz * (q1q3 - q0q2)
+                half_wy = bx * (q1q2 - q0q3) + bz * (q0q1 + q2q3)
+                half_wz = bx * (q0q2 + q1q3) + bz * (0.5 - q1q1 - q2q2)
+                half_ex += my * half_wz - mz * half_wy
+                half_ey += mz * half_wx - mx * half_wz
+                half_ez += mx * half_wy - my * half_wx
+
+            if self.ki > 0.0:
+                self.integral_x += 2.0 * self.ki * half_ex * dt
+                self.integral_y += 2.0 * self.ki * half_ey * dt
+                self.integral_z += 2.0 * self.ki * half_ez * dt
+                gx += self.integral_x
+                gy += self.integral_y
+                gz += self.integral_z
+            gx += 2.0 * self.kp * half_ex
+            gy += 2.0 * self.kp * half_ey
+            gz += 2.0 * self.kp * half_ez
+
+        gx *= 0.5 * dt
+        gy *= 0.5 * dt
+        gz *= 0.5 * dt
+        self.w = q0 - q1 * gx - q2 * gy - q3 * gz
+        self.x = q1 + q0 * gx + q2 * gz - q3 * gy
+        self.y = q2 + q0 * gy - q1 * gz + q3 * gx
+        self.z = q3 + q0 * gz + q1 * gy - q2 * gx
+        self._normalize()
+
+    def update_imu(
+        self, gx: float, gy: float, gz: float, ax: float, ay: float, az: float, dt: float
+    ) -> None:
+        """Like :meth:`update` without a magnetometer, the heading then drifts with the gyro"""
+        self.update(gx, gy, gz, ax, ay, az, 0.0, 0.0, 0.0, dt)
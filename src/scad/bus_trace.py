@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import time
+from array import array
+
+try:  # adding types can make the code more readable, but circuitpython doesn't support it
+    from typing import *
+except ImportError:
+    pass
+
+import adafruit_icm20x
+
+READ = 0
+WRITE = 1
+WRITE_READ = 2
+SLEEP = 3
+
+_KIND_NAMES = ("read", "write", "write_read", "sleep")
+
+
+class _TracedI2CDevice:
+    """Stands in for a driver's ``i2c_device``, timing every transaction it forwards"""
+
+    def __init__(self, tracer: BusTracer, device) -> None:
+        self._tracer = tracer
+        self._device = device
+        # adafruit_register and the driver only ever use these two attributes directly
+        self.i2c = device.i2c
+        self.device_address = device.device_address
+
+    def __enter__(self) -> _TracedI2CDevice:
+        self._device.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        return self._device.__exit__(exc_type, exc_value, traceback)
+
+    def readinto(self, buf, *, start: int = 0, end: int | None = None) -> None:
+        then = time.monotonic_ns()
+        self._device.readinto(buf, start=start, end=end)
+        end = len(buf) if end is None else end
+        self._tracer.record(READ, 0xFF, 0, end - start, time.monotonic_ns() - then)
+
+    def write(self, buf, *, start: int = 0, end: int | None = None) -> None:
+        then = time.monotonic_ns()
+        self._device.write(buf, start=start, end=end)
+        end = len(buf) if end is None else end
+        self._tracer.record(WRITE, buf[start], end - start, 0, time.monotonic_ns() - then)
+
+    def write_then_readinto(
+        self,
+        out_buffer,
+        in_buffer,
+        *,
+        out_start: int = 0,
+        out_end: int | None = None,
+        in_start: int = 0,
+        in_end: int | None = None,
+    ) -> None:
+        then = time.monotonic_ns()
+        self._device.write_then_readinto(
+            out_buffer,
+            in_buffer,
+            out_start=out_start,
+            out_end=out_end,
+            in_start=in_start,
+            in_end=in_end,
+        )
+        out_end = len(out_buffer) if out_end is None else out_end
+        in_end = len(in_buffer) if in_end is None else in_end
+        self._tracer.record(
+            WRITE_READ,
+            out_buffer[out_start],
+            out_end - out_start,
+            in_end - in_start,
+            time.monotonic_ns() - then,
+        )
+
+
+class BusTracer:
+    """
+    Opt-in instrumentation of an ICM20X driver: counts reads, writes and bytes, and the time
+    spent on the bus versus blocked in the driver's sleeps, per labelled section of code.
+
+    Usage:
+        tracer = BusTracer(icm)
+        with tracer.section("process_sample"):
+            process_sample(...)
+        print(tracer.summary())
+
+    Everything outside a section is counted under "other". The most recent ``trace_length``
+    events are also kept in a preallocated ring buffer, see :meth:`trace`.
+    """
+
+    def __init__(self, sensor, *, trace_length: int = 64, attach: bool = True) -> None:
+        """
+        :param sensor: the ICM20X driver instance to instrument
+        :param trace_length: number of events kept in the ring buffer
+        :param attach: start tracing immediately
+        """
+        self.sensor = sensor
+        self.labels: list[str] = ["other"]
+        self._label = 0
+        self._stats: list[list[int]] = [[0] * 7]
+
+        # ring buffer of the most recent events, as parallel compact arrays
+        self.trace_length = trace_length
+        self._trace_label = bytearray(trace_length)
+        self._trace_kind = bytearray(trace_length)
+        self._trace_register = bytearray(trace_length)
+        self._trace_bytes = array("H", (0 for _ in range(trace_length)))
+        self._trace_ns = array("L", (0 for _ in range(trace_length)))
+        self._trace_next = 0
+        self._trace_count = 0
+
+        self._device = None
+        self._sleep = None
+        if attach:
+            self.attach()
+
+    # --- installation ---
+    def attach(self) -> None:
+        """Routes the sensor's bus traffic and the driver's sleeps through the tracer"""
+        if self._device is not None:
+            return
+        self._device = self.sensor.i2c_device
+        self.sensor.i2c_device = _TracedI2CDevice(self, self._device)
+        # the driver calls its module level ``sleep`` for every blocking wait
+        self._sleep = adafruit_icm20x.sleep
+        adafruit_icm20x.sleep = self._traced_sleep
+
+    def detach(self) -> None:
+        """Restores the sensor's bus device and the driver's sleep"""
+        if self._device is None:
+            return
+        self.sensor.i2c_device = self._device
+        adafruit_icm20x.sleep = self._sleep
+        self._device = None
+        self._sleep = None
+
+    def _traced_sleep(self, seconds: float) -> None:
+        then = time.monotonic_ns()
+        self._sleep(seconds)
+        self.record(SLEEP, 0xFF, 0, 0, time.monotonic_ns() - then)
+
+    # --- labelling ---
+    def section(self, label: str) -> _Section:
+        """A context manager that attributes everything inside it to ``label``"""
+        if label not in self.labels:
+            self.labels.append(label)
+            self._stats.append([0] * 7)
+        return _Section(self, self.labels.index(label))
+
+    def read(self, name: str):
+        """Reads the sensor property ``name`` in a section of the same name and returns it"""
+        with self.section(name):
+            return getattr(self.sensor, name)
+
+    def call(self, name: str, *args):
+        """Calls the sensor method ``name`` in a section of the same name and returns the result"""
+        with self.section(name):
+            return getattr(self.sensor, name)(*args)
+
+    # --- recording ---
+    def record(self, kind: int, register: int, written: int, read: int, ns: int) -> None:
+        # calls, reads, writes, bytes_read, bytes_written, bus_ns, sleep_ns
+        stats = self._stats[self._label]
+        if kind == SLEEP:
+            stats[6] += ns
+        else:
+            if kind != WRITE:
+                stats[1] += 1
+            if kind != READ:
+                stats[2] += 1
+            stats[3] += read
+            stats[4] += written
+            stats[5] += ns
+
+        index = self._trace_next
+        self._trace_label[index] = self._label
+        self._trace_kind[index] = kind
+        self._trace_register[index] = register & 0xFF
+        self._trace_bytes[index] = written + read
+        self._trace_ns[index] = min(ns, 0xFFFFFFFF)
+        self._trace_next = (index + 1) % self.trace_length
+        if self._trace_count < self.trace_length:
+            self._trace_count += 1
+
+    def reset(self) -> None:
+        """Clears the counters and the trace"""
+        for stats in self._stats:
+            for index in range(len(stats)):
+                stats[index] = 0
+        self._trace_next = 0
+        self._trace_count = 0
+
+    # --- reporting ---
+    def summary(self) -> dict:
+        """
+        :return: per label, the number of times the section was entered, the I2C reads and
+            writes (a write-then-read counts as both), bytes each way, and the nanoseconds
+            spent on the bus and sleeping
+        """
+        return {
+            label: {
+                "calls": stats[0],
+                "reads": stats[1],
+                "writes": stats[2],
+                "bytes_read": stats[3],
+                "bytes_written": stats[4],
+                "bus_ns": stats[5],
+                "sleep_ns": stats[6],
+            }
+            for label, stats in zip(self.labels, self._stats)
+            if any(stats)
+        }
+
+    def trace(self) -> list:
+        """
+        :return: the buffered events oldest first, as ``(label, kind, register, bytes, ns)``
+            where register is the first byte written (255 for reads and sleeps)
+        """
+        events = []
+        start = (self._trace_next - self._trace_count) % self.trace_length
+        for offset in range(self._trace_count):
+            index = (start + offset) % self.trace_length
+            events.append(
+                (
+                    self.labels[self._trace_label[index]],
+                    _KIND_NAMES[self._trace_kind[index]],
+                    self._trace_register[index],
+                    self._trace_bytes[index],
+                    self._trace_ns[index],
+                )
+            )
+        return events
+
+
+class _Section:
+    def __init__(self, tracer: BusTracer, label: int) -> None:
+        self._tracer = tracer
+        self._label = label
+        self._outer = 0
+
+    def __enter__(self) -> BusTracer:
+        tracer = self._tracer
+        self._outer = tracer._label
+        tracer._label = self._label
+        tracer._stats[self._label][0] += 1
+        return tracer
+
+    def __exit__(self, exc_type, exc_value, traceback) -> bool:
+        self._tracer._label = self._outer
+        return False
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+try:  # adding types can make the code more readable, but circuitpython doesn't support it
+    from typing import *
+except ImportError:
+    pass
+
+# states of DoorStateMachine, the door counts as open in both OPEN and CLOSING
+CLOSED = "closed"
+OPEN = "open"
+CLOSING = "closing"  # open, but swinging shut
+
+
+class DoorStateMachine:
+    """
+    Turns the door angle into open/close events without chatter. A crossing of a threshold
+    is only reported once the angle has stayed past it for ``min_dwell`` seconds, unless
+    the door is moving through it faster than ``gate_rate`` and the current state has
+    already lasted ``min_dwell``, then it's reported straight away. A bounce back past a
+    threshold just after an event has to hold for the dwell time, a real swing doesn't.
+
+    An open door swinging shut faster than ``gate_rate`` is CLOSING until it is shut, or it
+    stops or turns back, which goes back to OPEN without an event.
+
+    Usage:
+        door = DoorStateMachine(door_close_thresh=0.3, door_open_thresh=0.35)
+        detector = OpenCloseDetector(..., state_machine=door)
+    """
+
+    def __init__(
+        self,
+        *,
+        door_close_thresh: float,
+        door_open_thresh: float,
+        min_dwell: float = 0.25,
+        gate_rate: float = 0.5,
+    ) -> None:
+        """
+        :param door_close_thresh: radians, the angle the door has to pass to be considered closed
+        :param door_open_thresh: radians, the angle the door has to pass to be considered open
+        :param min_dwell: seconds past a threshold before a slow crossing counts, and the
+            shortest time between two events
+        :param gate_rate: radians/second, the swing speed that counts without the dwell
+        """
+        self.door_close_thresh = door_close_thresh
+        self.door_open_thresh = door_open_thresh
+        self.min_dwell = min_dwell
+        self.gate_rate = gate_rate
+
+        # internal state
+        self.state: str = CLOSED
+        # seconds since the last event, and how long the angle has been past a threshold
+        self.state_time: float = 0.0
+        self.pending_time: float = 0.0
+        self._past: bool = False
+        # seconds before the latest update that the last event's threshold was first passed
+        self.event_age: float = 0.0
+
+    @property
+    def door_is_open(self) -> bool:
+        return self.state != CLOSED
+
+    def reset(self) -> None:
+        self.state = CLOSED
+        self.state_time = 0.0
+        self.pending_time = 0.0
+        self._past = False
+        self.event_age = 0.0
+
+    def update(self, angle: float, angular_velocity: float, dt: float) -> None | bool:
+        """
+        :param angle: radians, the door angle
+        :param angular_velocity: radians/second, positive opening
+        :param dt: seconds since the previous update
+        :return: True if the door just opened, False if it just closed, None if it hasn't changed
+        """
+        self.state_time += dt
+        settled = self.state_time >= self.min_dwell
+
+        if self.state == CLOSED:
+            if angle <= self.door_open_thresh:
+                self._past = False
+                return None
+            if (settled and angular_velocity > self.gate_rate) or self._dwelt(dt):
+                return self._change(OPEN, True)
+            return None
+
+        # open, or closing
+        if angular_velocity < -self.gate_rate:
+            self.state = CLOSING
+        elif self.state == CLOSING and angular_velocity > -0.5 * self.gate_rate:
+            self.state = OPEN
+
+        if angle >= self.door_close_thresh:
+            self._past = False
+            return None
+        if (settled and self.state == CLOSING) or self._dwelt(dt):
+            return self._change(CLOSED, False)
+        return None
+
+    def _dwelt(self, dt: float) -> bool:
+        """:return: True once the angle has been past the threshold for the dwell time"""
+        # the first update past the threshold starts the clock
+        if self._past:
+            self.pending_time += dt
+        else:
+            self._past = True
+            self.pending_time = 0.0
+        return self.pending_time >= self.min_dwell
+
+    def _change(self, state: str, event: bool) -> bool:
+        self.state = state
+        # a gated crossing is reported on the update that made it
+        self.event_age = self.pending_time if self._past else 0.0
+        self.state_time = 0.0
+        self.pending_time = 0.0
+        self._past = False
+        return event
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from array import array
+
+try:  # adding types can make the code more readable, but circuitpython doesn't support it
+    from typing import *
+except ImportError:
+    pass
+
+
+class EventQueue:
+    """
+    A bounded queue of door events, ``(timestamp, kind, angle, angular_velocity)`` with
+    ``kind`` True for opened and False for closed. The detector pushes one for every event
+    as the samples come in and the consumers pop them whenever they get round to it. The
+    records live in preallocated arrays; when the queue is full the oldest record is dropped
+    and :attr:`overflow` counts it.
+
+    Usage:
+        events = EventQueue(16)
+        detector = OpenCloseDetector(..., event_queue=events)
+        while events:
+            timestamp, opened, angle, angular_velocity = events.pop()
+    """
+
+    def __init__(self, size: int = 16) -> None:
+        if size < 1:
+            raise ValueError("an event queue needs room for at least 1 event")
+        self.size = size
+        self._timestamps = array("d", (0.0 for _ in range(size)))
+        self._kinds = bytearray(size)
+        self._angles = array("f", (0.0 for _ in range(size)))
+        self._angular_velocities = array("f", (0.0 for _ in range(size)))
+        self._first = 0
+        self._count = 0
+        # events dropped because the queue was full
+        self.overflow = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def clear(self) -> None:
+        self._first = 0
+        self._count = 0
+
+    def push(self, timestamp: float, kind: bool, angle: float, angular_velocity: float) -> None:
+        """
+        :param timestamp: seconds, when the threshold was crossed
+        :param kind: True if the door opened, False if it closed
+        :param angle: radians, the door angle at the event
+        :param angular_velocity: radians/second, how fast it was swinging
+        """
+        if self._count == self.size:
+            self._first = (self._first + 1) % self.size
+            self._count -= 1
+            self.overflow += 1
+        index = (self._first + self._count) % self.size
+        self._timestamps[index] = timestamp
+        self._kinds[index] = kind
+        self._angles[index] = angle
+        self._angular_velocities[index] = angular_velocity
+        self._count += 1
+
+    def pop(self) -> tuple[float, bool, float, float] | None:
+        """:return: the oldest record, None if the queue is empty"""
+        if not self._count:
+            return None
+        index = self._first
+        self._first = (index + 1) % self.size
+        self._count -= 1
+        return (
+            self._timestamps[index],
+            bool(self._kinds[index]),
+            self._angles[index],
+            self._angular_velocities[index],
+        )
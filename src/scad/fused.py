@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import math
+
+try:  # adding types can make the code more readable, but circuitpython doesn't support it
+    from typing import *
+except ImportError:
+    pass
+
+from scad.door_state import DoorStateMachine
+from scad.events import EventQueue
+from scad.open_close import EULER, OpenCloseDetector
+
+
+class FusedOpenCloseDetector(OpenCloseDetector):
+    """
+    An OpenCloseDetector whose angle doesn't drift: the integrated gyro is blended with the
+    door's absolute angle from the magnetometer in a complementary filter. The gyro carries
+    fast motion, the magnetometer slowly pulls the angle back to the truth.
+
+    The hinge axis is taken from gravity (the accelerometer) when the door is calibrated, so
+    the sensor doesn't have to be mounted square to it. The magnetic field is projected onto
+    the plane the door swings in, and the door angle is the rotation of that projection from
+    where it was when closed. Readings whose field strength has changed too much from the
+    calibration (a magnet, steel nearby) are ignored and the gyro carries on alone.
+    """
+
+    def __init__(
+        self,
+        *,
+        drift_thres: float,
+        door_close_thresh: float,
+        door_open_thresh: float,
+        debug_output: bool = True,
+        integrator: str = EULER,
+        auto_drift: bool = False,
+        noise_window: int = 200,
+        noise_multiple: float = 4.0,
+        state_machine: DoorStateMachine | None = None,
+        event_queue: EventQueue | None = None,
+        axis: int = 0,
+        time_constant: float = 2.0,
+        max_field_change: float = 0.2,
+    ) -> None:
+        """
+        :param axis: the index of the gyro axis closest to the hinge, sets the angle's sign
+        :param time_constant: seconds, how long the gyro is trusted over the magnetometer
+        :param max_field_change: the largest fractional change in the horizontal field
+            strength from the calibration that is still used
+        """
+        super().__init__(
+            drift_thres=drift_thres,
+            door_close_thresh=door_close_thresh,
+            door_open_thresh=door_open_thresh,
+            debug_output=debug_output,
+            integrator=integrator,
+            auto_drift=auto_drift,
+            noise_window=noise_window,
+            noise_multiple=noise_multiple,
+            state_machine=state_machine,
+            event_queue=event_queue,
+        )
+        self.axis = axis
+        self.time_constant = time_constant
+        self.max_field_change = max_field_change
+
+        # hinge axis and the closed door's field across it, in sensor coordinates
+        self.hinge: tuple[float, float, float] | None = None
+        self.reference: tuple[float, float, float] = (0.0, 0.0, 0.0)
+        self._reference_strength: float = 0.0
+        # the latest magnetometer angle, None if it was rejected or never measured
+        self.magnetic_angle: float | None = None
+
+    def calibrate(self) -> None:
+        """Zeroes the angle; the next sample with both vectors becomes the closed reference"""
+        super().calibrate()
+        self.hinge = None
+        self.magnetic_angle = None
+
+    def new_sample(
+        self,
+        sample: float,
+        dt: float,
+        acceleration: Sequence[float] | None = None,
+        magnetic: Sequence[float] | None = None,
+    ) -> None:
+        """
+        :param sample: radians/second about the hinge
+        :param dt: seconds since the previous sample
+        :param acceleration: m/s^2, only needed until the first sample after calibrating
+        :param magnetic: uT along the accelerometer's axes, as ``ICM20948.magnetic`` gives
+            it, leave out when there isn't a new magnetometer reading
+        """
+        self._add_sample(sample, dt)
+        # the events are decided on the corrected angle
+        if magnetic is not None:
+            self._correct(dt, acceleration, magnetic)
+        self._end_sample(sample, dt)
+
+    def correct(
+        self,
+        magnetic: Sequence[float],
+        dt: float,
+        acceleration: Sequence[float] | None = None,
+    ) -> None:
+        """
+        Pulls the angle towards a magnetometer reading taken apart from the gyro samples,
+        e.g. one per batch given to :meth:`new_samples`.
+        :param magnetic: uT along the accelerometer's axes
+        :param dt: seconds since the previous correction
+        :param acceleration: m/s^2, only needed until the first reading after calibrating
+        """
+        self._correct(dt, acceleration, magnetic)
+        # no time has passed since the last sample, only the angle has moved
+        self._decide(0.0)
+
+    def _correct(
+        self, dt: float, acceleration: Sequence[float] | None, magnetic: Sequence[float]
+    ) -> None:
+        if self.hinge is None:
+            if acceleration is not None:
+                self._set_reference(acceleration, magnetic)
+            return
+
+        self.magnetic_angle = self._magnetic_angle(magnetic)
+        if self.magnetic_angle is None:
+            return
+        # complementary filter, the gyro's share decays with the time constant
+        alpha = self.time_constant / (self.time_constant + dt)
+        self.angle = alpha * self.angle + (1.0 - alpha) * self.magnetic_angle
+
+    def _set_reference(self, acceleration: Sequence[float], magnetic: Sequence[float]) -> None:
+        x, y, z = acceleration
+        norm = math.sqrt(x * x + y * y + z * z)
+        if norm == 0.0:
+            return
+        # point the hinge the way the gyro axis does, so both angles share a sign
+        if acceleration[self.axis] < 0:
+            norm = -norm
+        self.hinge = (x / norm, y / norm, z / norm)
+        self.reference = self._across_hinge(magnetic)
+        rx, ry, rz = self.reference
+        self._reference_strength = math.sqrt(rx * rx + ry * ry + rz * rz)
+
+    def _across_hinge(self, magnetic: Sequence[float]) -> tuple[float, float, float]:
+        ux, uy, uz = self.hinge
+        mx, my, mz = magnetic
+        along = mx * ux + my * uy + mz * uz
+        return (mx - along * ux, my - along * uy, mz - along * uz)
+
+    def _magnetic_angle(self, magnetic: Sequence[float]) -> float | None:
+        hx, hy, hz = self._across_hinge(magnetic)
+        strength = math.sqrt(hx * hx + hy * hy + hz * hz)
+        if (
+            self._reference_strength == 0.0
+            or abs(strength - self._reference_strength)
+            > self.max_field_change * self._reference_strength
+        ):
+            return None
+
+        # the field turns the opposite way to the door in the sensor's frame
+        rx, ry, rz = self.reference
+        ux, uy, uz = self.hinge
+        sine = (ry * hz - rz * hy) * ux + (rz * hx - rx * hz) * uy + (rx * hy - ry * hx) * uz
+        cosine = rx * hx + ry * hy + rz * hz
+        return -math.atan2(sine, cosine)
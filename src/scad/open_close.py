@@ -1,10 +1,28 @@
 from __future__ import annotations
 
+import math
+
 try:  # adding types can make the code more readable, but circuitpython doesn't support it
     from typing import *
 except ImportError:
     pass
 
+# vectorize batches where numpy is around (on a laptop), ulab lacks cumsum so boards loop
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from scad.door_state import CLOSED, CLOSING, OPEN, DoorStateMachine
+from scad.events import EventQueue
+from scad.stillness import RunningVariance
+
+# integration rules for OpenCloseDetector
+EULER = "euler"  # the current sample times dt
+TRAPEZOID = "trapezoid"  # the mean of the previous and current samples times dt
+# the quadratic through the last three samples, the running form of simpson's rule
+SIMPSON = "simpson"
+
 
 class OpenCloseDetector:
     def __init__(
@@ -14,55 +32,513 @@ class OpenCloseDetector:
         door_close_thresh: float,
         door_open_thresh: float,
         debug_output: bool = True,
+        gyro_bias: float = 0.0,
+        integrator: str = EULER,
+        auto_drift: bool = False,
+        noise_window: int = 200,
+        noise_multiple: float = 4.0,
+        state_machine: DoorStateMachine | None = None,
+        event_queue: EventQueue | None = None,
     ) -> None:
         """
         :param drift_thres: radians, the minumum angle a new sample has to be to be considered valid
+            or, with ``auto_drift``, the most the dead-band is allowed to grow to and the
+            dead-band until the first window of noise has been measured
         :param door_close_thresh: radians, the angle the door has to pass to be considered closed
         :param door_open_thresh: radians, the angle the door has to pass to be considered open
+        :param gyro_bias: radians/second, subtracted from every sample, see :meth:`rezero`
+        :param integrator: EULER, TRAPEZOID or SIMPSON. The higher order rules follow the
+            curve of a swing closely enough to sample less often for the same accuracy.
+        :param auto_drift: derive the dead-band from the gyro's own noise, measured while the
+            door is shut, so it follows each device and its temperature. A bias left over
+            isn't the band's job, :meth:`rezero` it away once a stillness check, e.g.
+            :class:`~scad.stillness.StillnessDetector`, has seen the door at rest.
+        :param noise_window: samples the noise is measured over in ``auto_drift`` mode
+        :param noise_multiple: the dead-band in standard deviations of the noise
+        :param state_machine: decides the events instead of the bare thresholds, stepped
+            with every sample so its dwell times and speeds see each one
+        :param event_queue: gets a record of every event, timestamped from :attr:`time`
         """
+        if integrator not in (EULER, TRAPEZOID, SIMPSON):
+            raise ValueError(f"unknown integrator {integrator!r}")
 
         # input
         self.drift_thres = drift_thres
         self.door_close_thresh = door_close_thresh
         self.door_open_thresh = door_open_thresh
         self.debug_output = debug_output
+        self.gyro_bias = gyro_bias
+        self.integrator = integrator
+        self.max_drift_thres = drift_thres
+        self.noise_multiple = noise_multiple
+        # the spread of the shut door's samples, None unless auto_drift
+        self.noise: RunningVariance | None = RunningVariance(noise_window) if auto_drift else None
+        self.state_machine = state_machine
+        self.event_queue = event_queue
 
         # internal state
         self.angle: float = 0
+        # seconds, the time of the latest sample. Every sample moves it on by its dt, set it
+        # to the clock the events should be timestamped in, e.g. after each read.
+        self.time: float = 0.0
         self.door_is_open: bool = False
+        # seconds before the latest sample that the threshold of the last event was crossed
+        self.event_offset: float = 0.0
+        self._previous_angle: float = 0
+        self._last_dt: float = 0.0
+        # the last two dead-banded rates and the interval between them, for the higher orders
+        self._previous_rate: float = 0.0
+        self._older_rate: float = 0.0
+        self._previous_dt: float = 0.0
+        self._history: int = 0
+        # the state machine's latest event, until get_event hands it out
+        self._event: bool | None = None
 
     def calibrate(self) -> None:
         self.angle = 0
         self.door_is_open = False
+        self._event = None
+        if self.state_machine is not None:
+            self.state_machine.reset()
         print("calibrating!!")
 
+    def rezero(self, gyro_bias: float | None = None) -> None:
+        """
+        Snaps the angle back to the closed reference, e.g. once the door has been seen at
+        rest near it, without changing whether the door counts as open.
+        :param gyro_bias: radians/second, a new bias to subtract from the raw samples
+        """
+        self.angle = 0
+        if gyro_bias is not None:
+            self.gyro_bias = gyro_bias
+
+    @property
+    def _per_sample(self) -> bool:
+        """events are decided as each sample comes in, rather than when get_event is called"""
+        return self.state_machine is not None or self.event_queue is not None
+
     def new_sample(self, sample: float, dt: float) -> None:
-        d_angle: float = sample * dt
-        d_thresh = self.drift_thres * dt
+        self._add_sample(sample, dt)
+        self._end_sample(sample, dt)
 
-        # skip this if the new sample is below the threshold
-        if -d_thresh < d_angle < d_thresh:
-            pass
+    def _add_sample(self, sample: float, dt: float) -> None:
+        """integrates the sample into the angle, subclasses can correct it before it's used"""
+        self._previous_angle = self.angle
+        self._last_dt = dt
+        self.time += dt
+        rate = sample - self.gyro_bias
+        if self.noise is not None and self._is_shut(self.angle, self.door_is_open):
+            self._track_noise(rate)
+        self.angle += self._integrate(rate, dt)
 
-        # continue the integration
-        else:
-            self.angle += d_angle
+    def _end_sample(self, sample: float, dt: float) -> None:
+        """decides on an event from the finished angle"""
+        self._decide(dt)
 
         # print("Gyro X:%.2f, Y: %.2f, Z: %.2f rads/s" % (gyro))
         if self.debug_output:
             print(f"({self.angle}, {sample}, 3.141592653589, -1)")
             print("")
 
+    def set_angle(self, angle: float, dt: float) -> None:
+        """
+        Takes the angle from elsewhere, e.g. an AHRS, in place of integrating a sample.
+        :param angle: radians
+        :param dt: seconds since the previous angle
+        """
+        self._previous_angle = self.angle
+        self._last_dt = dt
+        self.time += dt
+        self._previous_rate = (angle - self.angle) / dt if dt > 0 else 0.0
+        self.angle = angle
+        self._decide(dt)
+
+    def _decide(self, dt: float) -> None:
+        """holds on to the latest sample's event for get_event, when they're decided per sample"""
+        if self._per_sample:
+            event = self._detect(dt)
+            if event is not None:
+                self._event = event
+
+    def _detect(self, dt: float) -> None | bool:
+        """decides the event for the latest sample and queues its record"""
+        machine = self.state_machine
+        if machine is None:
+            event = self._check_thresholds()
+        else:
+            event = machine.update(self.angle, self._previous_rate, dt)
+            self.door_is_open = machine.door_is_open
+            if event is not None:
+                if machine.event_age > 0.0:
+                    self.event_offset = machine.event_age
+                else:
+                    threshold = self.door_open_thresh if event else self.door_close_thresh
+                    self._set_event_offset(threshold)
+
+        if event is not None and self.event_queue is not None:
+            self.event_queue.push(
+                self.time - self.event_offset, event, self.angle, self._previous_rate
+            )
+        return event
+
+    def _is_shut(self, angle: float, door_is_open: bool) -> bool:
+        return not door_is_open and -self.door_close_thresh < angle < self.door_close_thresh
+
+    def _track_noise(self, rate: float) -> None:
+        """
+        Adds a rate seen while the door is shut to the noise window and derives the dead-band
+        from its spread. The mean is left out: a slow swing looks just like a bias to the gyro,
+        and only the spread can be trusted not to swallow one. A swing starting inside the
+        closed threshold only widens the dead-band up to ``max_drift_thres`` until it has
+        left the window.
+        """
+        noise = self.noise
+        noise.add(rate)
+        if noise.full:
+            self.drift_thres = min(
+                self.noise_multiple * math.sqrt(noise.variance), self.max_drift_thres
+            )
+
+    def _integrate(self, rate: float, dt: float) -> float:
+        """:return: the angle turned through over the interval ``dt`` ending at ``rate``"""
+        # skip this if the new sample is below the threshold
+        if -self.drift_thres < rate < self.drift_thres:
+            rate = 0.0
+
+        older = self._older_rate
+        previous = self._previous_rate
+        h1 = self._previous_dt
+        history = self._history
+        self._older_rate = previous
+        self._previous_rate = rate
+        self._previous_dt = dt
+        if history < 2:
+            self._history = history + 1
+
+        if self.integrator == EULER or history == 0:
+            return rate * dt
+        if self.integrator == TRAPEZOID or history == 1 or h1 <= 0.0:
+            return (previous + rate) * 0.5 * dt
+        # integrate the quadratic through the last three samples over the last interval
+        h2 = dt
+        return (
+            -older * h2 * h2 * h2 / (6.0 * h1 * (h1 + h2))
+            + previous * (h2 * h2 / (6.0 * h1) + h2 * 0.5)
+            + rate * (h2 * h2 / 3.0 + h1 * h2 * 0.5) / (h1 + h2)
+        )
+
     def get_event(self) -> None | bool:
         """
-        Call to see if the status of the door has changed.
+        Call to see if the status of the door has changed. When it has, :attr:`event_offset`
+        is how long before the latest sample the threshold was crossed, interpolated between
+        it and the one before.
         :return: True if the door just opened, False if it just closed, None if it hasn't changed
         """
+        if self._per_sample:
+            # already decided sample by sample
+            event = self._event
+            self._event = None
+            return event
+        return self._check_thresholds()
 
+    def _check_thresholds(self) -> None | bool:
         if self.door_is_open and self.angle < self.door_close_thresh:
             self.door_is_open = False
+            self._set_event_offset(self.door_close_thresh)
             return False
         elif not self.door_is_open and self.angle > self.door_open_thresh:
+            self.door_is_open = True
+            self._set_event_offset(self.door_open_thresh)
+            return True
+        else:
+            return None
+
+    def _set_event_offset(self, threshold: float) -> None:
+        span = self.angle - self._previous_angle
+        if span == 0:
+            self.event_offset = 0.0
+            return
+        offset = (self.angle - threshold) / span * self._last_dt
+        # crossed before the previous sample if get_event wasn't called in between
+        self.event_offset = min(max(offset, 0.0), self._last_dt)
+
+    def new_samples(
+        self, samples: Sequence[float], dts: Sequence[float] | float, count: int | None = None
+    ) -> list[tuple[int, bool]]:
+        """
+        Feeds a batch of samples through the same dead-band, integration and thresholds as
+        :meth:`new_sample`, e.g. a drained FIFO or a recording. With numpy the whole batch is
+        one vectorized pass; on the board it's a plain loop with no per sample call or print.
+        The events are returned here rather than from :meth:`get_event`.
+        :param samples: radians/second, an ``array('f')``, list or numpy array
+        :param dts: seconds, one per sample or a single interval for all of them
+        :param count: only use the first ``count`` samples, for reused buffers
+        :return: ``(index, event)`` for every event, ``event`` as from :meth:`get_event`
+        """
+        if count is None:
+            count = len(samples)
+        if count <= 0:
+            return []
+        if (
+            np is not None
+            and self.integrator == EULER
+            and self.noise is None
+            and not self._per_sample
+        ):
+            events = self._new_samples_vectorized(samples, dts, count)
+        else:
+            events = self._new_samples_loop(samples, dts, count)
+
+        if self.debug_output:
+            print(f"({self.angle}, {samples[count - 1]}, 3.141592653589, -1)")
+            print("")
+        return events
+
+    def _new_samples_loop(
+        self, samples: Sequence[float], dts: Sequence[float] | float, count: int
+    ) -> list[tuple[int, bool]]:
+        events: list[tuple[int, bool]] = []
+        uniform = isinstance(dts, (int, float))
+        dt = dts
+        angle = self.angle
+        door_is_open = self.door_is_open
+        # added up from the start of the batch, a large time would swallow small steps
+        start = self.time
+        elapsed = 0.0
+        for index in range(count):
+            if not uniform:
+                dt = dts[index]
+            elapsed += dt
+            previous_angle = angle
+            rate = samples[index] - self.gyro_bias
+            if self.noise is not None and self._is_shut(angle, door_is_open):
+                self._track_noise(rate)
+            angle += self._integrate(rate, dt)
+
+            if self._per_sample:
+                self._previous_angle = previous_angle
+                self._last_dt = dt
+                self.angle = angle
+                self.time = start + elapsed
+                event = self._detect(dt)
+                door_is_open = self.door_is_open
+                if event is not None:
+                    events.append((index, event))
+            elif door_is_open and angle < self.door_close_thresh:
+                door_is_open = False
+                events.append((index, False))
+            elif not door_is_open and angle > self.door_open_thresh:
+                door_is_open = True
+                events.append((index, True))
+
+        self._previous_angle = previous_angle
+        self._last_dt = dt
+        self.time = start + elapsed
+        self.angle = angle
+        self.door_is_open = door_is_open
+        return events
+
+    def _new_samples_vectorized(
+        self, samples: Sequence[float], dts: Sequence[float] | float, count: int
+    ) -> list[tuple[int, bool]]:
+        samples = np.asarray(samples, dtype=float)[:count]
+        dts = np.asarray(dts, dtype=float)
+        if dts.ndim:
+            dts = dts[:count]
+        rates = samples - self.gyro_bias
+        rates[(-self.drift_thres < rates) & (rates < self.drift_thres)] = 0.0
+        angles = self.angle + np.cumsum(rates * dts)
+
+        # keep the history the higher order rules and a later single sample would
+        self._older_rate = float(rates[-2]) if count > 1 else self._previous_rate
+        self._previous_rate = float(rates[-1])
+        self._previous_dt = float(dts[-1]) if dts.ndim else float(dts)
+        self._history = min(2, self._history + count)
+        self._previous_angle = float(angles[-2]) if count > 1 else self.angle
+        self._last_dt = self._previous_dt
+        self.time += float(np.sum(dts)) if dts.ndim else float(dts) * count
+
+        # the state can only flip where the angle first goes past a threshold, so only
+        # those few indices need walking in order
+        above = angles > self.door_open_thresh
+        below = angles < self.door_close_thresh
+        opens = np.flatnonzero(above & ~np.concatenate(([False], above[:-1])))
+        closes = np.flatnonzero(below & ~np.concatenate(([False], below[:-1])))
+        candidates = sorted(
+            [(int(index), True) for index in opens] + [(int(index), False) for index in closes]
+        )
+
+        events: list[tuple[int, bool]] = []
+        door_is_open = self.door_is_open
+        for index, opened in candidates:
+            if opened != door_is_open:
+                door_is_open = opened
+                events.append((index, opened))
+
+        self.angle = float(angles[-1])
+        self.door_is_open = door_is_open
+        return events
+
+
+class FixedPointOpenCloseDetector:
+    """
+    An OpenCloseDetector for the hottest loop: it takes raw gyro counts and integer tick
+    deltas and keeps the angle as an integer in counts * ticks, so integrating a sample is
+    integer math only. CircuitPython boxes every float result on the heap, small integers
+    it doesn't. The angle is only converted to radians when :attr:`angle` is read.
+
+    Usage:
+        detector = FixedPointOpenCloseDetector(..., gyro_scale=icm.gyro_scale)
+        detector.new_sample(icm.gyro_raw_into(raw)[0], supervisor.ticks_ms() - then)
+    """
+
+    def __init__(
+        self,
+        *,
+        drift_thres: float,
+        door_close_thresh: float,
+        door_open_thresh: float,
+        gyro_scale: float,
+        tick: float = 0.001,
+        gyro_bias: float = 0.0,
+        state_machine: DoorStateMachine | None = None,
+    ) -> None:
+        """
+        :param drift_thres: radians/second, the smallest rate a sample needs to be integrated
+        :param door_close_thresh: radians, the angle the door has to pass to be considered closed
+        :param door_open_thresh: radians, the angle the door has to pass to be considered open
+        :param gyro_scale: radians/second per gyro count, ``ICM20X.gyro_scale``
+        :param tick: seconds per tick of the deltas given to :meth:`new_sample`
+        :param gyro_bias: radians/second, subtracted from every sample
+        :param state_machine: debounces the events as :class:`OpenCloseDetector`'s does. Its
+            thresholds, dwell and gate are converted to counts and ticks here and the debounce
+            runs on them in integer math, the machine itself is only read for its settings.
+        """
+        self.gyro_scale = gyro_scale
+        self.tick = tick
+        # radians per unit of the integer angle
+        self._angle_scale = gyro_scale * tick
+        self._drift_counts = round(drift_thres / gyro_scale)
+        self._close_thresh = round(door_close_thresh / self._angle_scale)
+        self._open_thresh = round(door_open_thresh / self._angle_scale)
+        self._bias_counts = round(gyro_bias / gyro_scale)
+        self.state_machine = state_machine
+        if state_machine is not None:
+            self._machine_close = round(state_machine.door_close_thresh / self._angle_scale)
+            self._machine_open = round(state_machine.door_open_thresh / self._angle_scale)
+            self._dwell_ticks = round(state_machine.min_dwell / tick)
+            self._gate_counts = round(state_machine.gate_rate / gyro_scale)
+
+        # internal state
+        self._angle: int = 0
+        self.door_is_open: bool = False
+        # the debounce, as DoorStateMachine's but in ticks, the state ticks stop at the dwell
+        self._state: str = CLOSED
+        self._state_ticks: int = 0
+        self._pending_ticks: int = 0
+        self._past: bool = False
+        # the state machine's latest event, until get_event hands it out
+        self._event: bool | None = None
+
+    @property
+    def angle(self) -> float:
+        """radians, converted from the integer angle"""
+        return self._angle * self._angle_scale
+
+    @property
+    def gyro_bias(self) -> float:
+        return self._bias_counts * self.gyro_scale
+
+    def calibrate(self) -> None:
+        self._angle = 0
+        self.door_is_open = False
+        self._event = None
+        self._state = CLOSED
+        self._state_ticks = 0
+        self._pending_ticks = 0
+        self._past = False
+        print("calibrating!!")
+
+    def rezero(self, gyro_bias: float | None = None) -> None:
+        """Snaps the angle back to the closed reference, see :meth:`OpenCloseDetector.rezero`"""
+        self._angle = 0
+        if gyro_bias is not None:
+            self._bias_counts = round(gyro_bias / self.gyro_scale)
+
+    def new_sample(self, sample: int, ticks: int) -> None:
+        """
+        :param sample: raw signed gyro counts about the hinge
+        :param ticks: ticks since the previous sample
+        """
+        sample -= self._bias_counts
+        # skip this if the new sample is below the threshold
+        if sample >= self._drift_counts or sample <= -self._drift_counts:
+            self._angle += sample * ticks
+        else:
+            sample = 0
+
+        if self.state_machine is not None:
+            event = self._debounce(sample, ticks)
+            if event is not None:
+                self._event = event
+
+    def _debounce(self, sample: int, ticks: int) -> None | bool:
+        """:meth:`DoorStateMachine.update` on the integer angle, counts and ticks"""
+        if self._state_ticks < self._dwell_ticks:
+            self._state_ticks += ticks
+        settled = self._state_ticks >= self._dwell_ticks
+
+        if self._state == CLOSED:
+            if self._angle <= self._machine_open:
+                self._past = False
+                return None
+            if (settled and sample > self._gate_counts) or self._dwelt(ticks):
+                return self._change(OPEN, True)
+            return None
+
+        # open, or closing
+        if sample < -self._gate_counts:
+            self._state = CLOSING
+        elif self._state == CLOSING and 2 * sample > -self._gate_counts:
+            self._state = OPEN
+
+        if self._angle >= self._machine_close:
+            self._past = False
+            return None
+        if (settled and self._state == CLOSING) or self._dwelt(ticks):
+            return self._change(CLOSED, False)
+        return None
+
+    def _dwelt(self, ticks: int) -> bool:
+        """:return: True once the angle has been past the threshold for the dwell ticks"""
+        if self._past:
+            self._pending_ticks += ticks
+        else:
+            self._past = True
+            self._pending_ticks = 0
+        return self._pending_ticks >= self._dwell_ticks
+
+    def _change(self, state: str, event: bool) -> bool:
+        self._state = state
+        self.door_is_open = state != CLOSED
+        self._state_ticks = 0
+        self._pending_ticks = 0
+        self._past = False
+        return event
+
+    def get_event(self) -> None | bool:
+        """
+        Call to see if the status of the door has changed.
+        :return: True if the door just opened, False if it just closed, None if it hasn't changed
+        """
+        if self.state_machine is not None:
+            event = self._event
+            self._event = None
+            return event
+        if self.door_is_open and self._angle < self._close_thresh:
+            self.door_is_open = False
+            return False
+        elif not self.door_is_open and self._angle > self._open_thresh:
             self.door_is_open = True
             return True
         else:
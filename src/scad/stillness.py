@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+from array import array
+
+try:  # adding types can make the code more readable, but circuitpython doesn't support it
+    from typing import *
+except ImportError:
+    pass
+
+
+class RunningVariance:
+    """
+    The mean and variance of the last ``size`` values, each new value updating them in
+    constant time (Welford's method, with the oldest value swapped out once the window is
+    full). The window is a preallocated ``array('f')``.
+    """
+
+    def __init__(self, size: int) -> None:
+        if size < 2:
+            raise ValueError("a running variance needs a window of at least 2")
+        self.size = size
+        self._values = array("f", (0.0 for _ in range(size)))
+        self._next = 0
+        self.count = 0
+        self.mean: float = 0.0
+        self._m2: float = 0.0
+
+    def reset(self) -> None:
+        self._next = 0
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value: float) -> None:
+        index = self._next
+        old = self._values[index]
+        self._values[index] = value
+        # use the value as stored, so it cancels exactly when it leaves the window
+        value = self._values[index]
+        self._next = (index + 1) % self.size
+
+        if self.count < self.size:
+            self.count += 1
+            delta = value - self.mean
+            self.mean += delta / self.count
+            self._m2 += delta * (value - self.mean)
+        else:
+            old_mean = self.mean
+            self.mean += (value - old) / self.size
+            self._m2 += (value - old) * (value - self.mean + old - old_mean)
+            if self._m2 < 0.0:  # rounding
+                self._m2 = 0.0
+
+    @property
+    def full(self) -> bool:
+        return self.count == self.size
+
+    @property
+    def variance(self) -> float:
+        if self.count < 2:
+            return 0.0
+        return self._m2 / (self.count - 1)
+
+
+class StillnessDetector:
+    """
+    Decides whether the sensor is at rest from the spread of the last ``window`` gyro (and,
+    if given, acceleration) samples, and for how long it has been. While still, the mean of
+    the gyro window is its bias.
+
+    Usage:
+        stillness = StillnessDetector(window=100, gyro_noise=0.01)
+        if stillness.update(sample, dt) and stillness.still_time > 5:
+            detector.rezero(gyro_bias=stillness.gyro_bias)
+            stillness.still_time = 0.0
+    """
+
+    def __init__(
+        self, *, window: int, gyro_noise: float, acceleration_noise: float | None = None
+    ) -> None:
+        """
+        :param window: samples the spread is measured over
+        :param gyro_noise: radians/second, the largest standard deviation of the gyro at rest
+        :param acceleration_noise: m/s^2, the same for the acceleration, if it is given
+        """
+        self.gyro = RunningVariance(window)
+        self.acceleration = RunningVariance(window)
+        self.gyro_noise = gyro_noise
+        self.acceleration_noise = acceleration_noise
+        # seconds the sensor has been still for, 0 while moving
+        self.still_time: float = 0.0
+
+    def reset(self) -> None:
+        self.gyro.reset()
+        self.acceleration.reset()
+        self.still_time = 0.0
+
+    def update(self, sample: float, dt: float, acceleration: float | None = None) -> bool:
+        """
+        :param sample: radians/second, the raw gyro sample
+        :param dt: seconds since the previous sample
+        :param acceleration: m/s^2, e.g. the magnitude of the acceleration, if it was read
+        :return: True if the sensor is still
+        """
+        self.gyro.add(sample)
+        still = self.gyro.full and self.gyro.variance < self.gyro_noise * self.gyro_noise
+        if acceleration is not None and self.acceleration_noise is not None:
+            self.acceleration.add(acceleration)
+            still = (
+                still
+                and self.acceleration.full
+                and self.acceleration.variance
+                < self.acceleration_noise * self.acceleration_noise
+            )
+
+        if still:
+            self.still_time += dt
+        else:
+            self.still_time = 0.0
+        return still
+
+    @property
+    def gyro_bias(self) -> float:
+        """radians/second, the mean of the gyro window, its bias while still"""
+        return self.gyro.mean
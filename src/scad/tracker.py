@@ -14,17 +14,15 @@ class DoorTimeTracker:
         self.last_time_door_open = -1
         self.door_open = False
 
-    def door_opened(self):
-        self.last_time_door_open = time.monotonic()
+    def door_opened(self, now: float | None = None):
+        self.last_time_door_open = now or time.monotonic()  # when the door opened, if known
         self.door_open = True
         self.open_count += 1
         print("[[door opened]]")
-        time.sleep(0.25)
 
     def door_closed(self):
         self.door_open = False
         print("[[door closed]]")
-        time.sleep(0.25)
 
     def open_too_long(self, now: float | None = None) -> bool:
         now = now or time.monotonic()  # if no now provided, use the current time
@@ -33,6 +31,5 @@ class DoorTimeTracker:
         if ret and not self.is_open_too_long:
             self.open_too_long_count += 1
             print("[[door open too long]]")
-            time.sleep(0.25)
         self.is_open_too_long = ret
         return ret
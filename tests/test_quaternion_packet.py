@@ -0,0 +1,30 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from adafruit_bluefruit_connect.packet import Packet
+from adafruit_bluefruit_connect.quaternion_packet import QuaternionPacket
+from scad.ahrs import MadgwickAHRS
+
+
+def test_quaternion_packet_round_trips():
+    data = QuaternionPacket(0.25, -0.5, 0.125, 0.75).to_bytes()
+
+    assert isinstance(data, bytes)
+    assert len(data) == QuaternionPacket.PACKET_LENGTH
+    packet = Packet.from_bytes(data)
+    assert isinstance(packet, QuaternionPacket)
+    assert (packet.x, packet.y, packet.z, packet.w) == (0.25, -0.5, 0.125, 0.75)
+
+
+def test_ahrs_quaternion_packet_serializes():
+    ahrs = MadgwickAHRS()
+    ahrs.update(0.1, 0.0, 0.2, 0.0, 0.0, 9.8, 20.0, 0.0, -40.0, 0.01)
+
+    packet = Packet.from_bytes(ahrs.quaternion_packet().to_bytes())
+    # the packet carries 32 bit floats
+    w, x, y, z = ahrs.quaternion
+    assert (packet.x, packet.y, packet.z, packet.w) == pytest.approx((x, y, z, w), rel=1e-6)
@@ -0,0 +1,100 @@
+"""
+Benchmarks bus transactions and bus time per sample for the ICM20X driver against the
+simulated bus in :mod:`icm20x_sim`.
+
+Run from the repository root with ``adafruit-circuitpython-busdevice`` and
+``adafruit-circuitpython-register`` installed::
+
+    python tools/bench_icm20x.py
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import time
+from array import array
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import adafruit_icm20x  # pylint: disable=wrong-import-position
+from icm20x_sim import (  # pylint: disable=wrong-import-position
+    ICM20948Model,
+    SimulatedI2C,
+    door_swing_source,
+)
+
+SAMPLES = 200
+
+
+def measure(bus: SimulatedI2C, label: str, action, samples: int = SAMPLES) -> None:
+    bus.reset_counters()
+    start = time.perf_counter()
+    for _i in range(samples):
+        action()
+    wall = time.perf_counter() - start
+    counters = bus.counters
+    print(
+        "%-24s %8.2f %10.1f %12.1f %10.1f"
+        % (
+            label,
+            counters["transactions"] / samples,
+            (counters["bytes_read"] + counters["bytes_written"]) / samples,
+            counters["bus_time"] / samples * 1e6,
+            wall / samples * 1e6,
+        )
+    )
+
+
+def main() -> None:
+    model = ICM20948Model(source=door_swing_source())
+    bus = SimulatedI2C(model)
+
+    start = time.perf_counter()
+    icm = adafruit_icm20x.ICM20948(bus)
+    cold = time.perf_counter() - start
+    cold_counters = bus.counters
+    bus.reset_counters()
+    start = time.perf_counter()
+    adafruit_icm20x.ICM20948(bus, warm_start=True)
+    warm = time.perf_counter() - start
+    print(
+        "cold boot: %.1f ms, %d transactions; warm start: %.1f ms, %d transactions\n"
+        % (cold * 1e3, cold_counters["transactions"], warm * 1e3, bus.transactions)
+    )
+
+    print(
+        "%-24s %8s %10s %12s %10s"
+        % ("per sample", "xfers", "bytes", "bus us", "wall us")
+    )
+    buffer = array("f", (0.0, 0.0, 0.0))
+    measure(bus, "gyro", lambda: icm.gyro)
+    measure(bus, "gyro_raw", lambda: icm.gyro_raw)
+    measure(bus, "gyro_into", lambda: icm.gyro_into(buffer))
+    measure(bus, "acceleration", lambda: icm.acceleration)
+    measure(bus, "magnetic", lambda: icm.magnetic)
+    measure(bus, "gyro+accel+magnetic", lambda: (icm.gyro, icm.acceleration, icm.magnetic))
+    measure(bus, "read_all", icm.read_all)
+    measure(bus, "gyro_data_rate_divisor", lambda: icm.gyro_data_rate_divisor)
+
+    icm.gyro_data_rate_divisor = 1  # 550 Hz
+    icm.enable_fifo(acceleration=False, gyro=True)
+    time.sleep(0.05)
+    bus.reset_counters()
+    frames = sum(1 for _frame in icm.read_fifo())
+    counters = bus.counters
+    print(
+        "%-24s %8.2f %10.1f %12.1f %10s"
+        % (
+            "read_fifo (%d frames)" % frames,
+            counters["transactions"] / frames,
+            (counters["bytes_read"] + counters["bytes_written"]) / frames,
+            counters["bus_time"] / frames * 1e6,
+            "-",
+        )
+    )
+    icm.disable_fifo()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,482 @@
+"""
+Host-side simulation of an I2C bus with an ICM20948 (and its AK09916 magnetometer) attached.
+
+``SimulatedI2C`` stands in for ``busio.I2C`` so :mod:`adafruit_icm20x` runs unmodified on a
+Linux box (with ``adafruit_bus_device`` and ``adafruit_register`` installed from PyPI). Every
+transaction is counted and costed in simulated bus time so driver changes can be benchmarked
+by how many transactions and how much bus time they need per sample.
+"""
+
+from __future__ import annotations
+
+import math
+import time
+
+try:
+    from typing import *
+except ImportError:
+    pass
+
+# ICM20948 register addresses used by the model, (bank, register)
+_REG_BANK_SEL = 0x7F
+_WHO_AM_I = 0x00
+_USER_CTRL = 0x03
+_LP_CONFIG = 0x05
+_PWR_MGMT_1 = 0x06
+_PWR_MGMT_2 = 0x07
+_INT_PIN_CFG = 0x0F
+_INT_ENABLE = 0x10
+_INT_ENABLE_1 = 0x11
+_INT_ENABLE_2 = 0x12
+_INT_ENABLE_3 = 0x13
+_I2C_MST_STATUS = 0x17
+_INT_STATUS = 0x19
+_INT_STATUS_1 = 0x1A
+_INT_STATUS_2 = 0x1B
+_INT_STATUS_3 = 0x1C
+_ACCEL_XOUT_H = 0x2D
+_EXT_SLV_SENS_DATA_00 = 0x3B
+_FIFO_EN_1 = 0x66
+_FIFO_EN_2 = 0x67
+_FIFO_RST = 0x68
+_FIFO_COUNTH = 0x70
+_FIFO_COUNTL = 0x71
+_FIFO_R_W = 0x72
+
+_GYRO_SMPLRT_DIV = 0x00
+_GYRO_CONFIG_1 = 0x01
+_XG_OFFS_USRH = 0x03
+_ACCEL_SMPLRT_DIV_1 = 0x10
+_ACCEL_SMPLRT_DIV_2 = 0x11
+_ACCEL_INTEL_CTRL = 0x12
+_ACCEL_WOM_THR = 0x13
+_ACCEL_CONFIG = 0x14
+
+_I2C_SLV0_ADDR = 0x03
+_I2C_SLV0_REG = 0x04
+_I2C_SLV0_CTRL = 0x05
+_I2C_SLV4_ADDR = 0x13
+_I2C_SLV4_REG = 0x14
+_I2C_SLV4_CTRL = 0x15
+_I2C_SLV4_DO = 0x16
+_I2C_SLV4_DI = 0x17
+
+_FIFO_SIZE = 512
+_TEMP_SENSITIVITY = 333.87  # LSB/degC
+_TEMP_OFFSET = 21.0
+_MAG_UT_PER_LSB = 0.15
+
+_RESET_VALUES = {
+    (0, _WHO_AM_I): 0xEA,
+    (0, _LP_CONFIG): 0x40,
+    (0, _PWR_MGMT_1): 0x41,
+    (2, _GYRO_CONFIG_1): 0x01,
+    (2, _ACCEL_CONFIG): 0x01,
+}
+
+
+def still_source(t: float) -> tuple:
+    """A sensor lying flat and motionless: 1 g on Z, a small gyro bias, a fixed field"""
+    return (0.0, 0.0, 1.0), (0.15, -0.1, 0.05), 24.0, (20.0, -5.0, -40.0)
+
+
+def door_swing_source(
+    period: float = 8.0, swing_time: float = 2.0, amplitude: float = 90.0
+) -> Callable:
+    """Returns a source that swings a door open and closed about X every ``period`` seconds
+
+    The door opens by ``amplitude`` degrees over ``swing_time`` seconds, dwells, then closes
+    over the same time. A constant gyro bias is added so drift handling can be exercised.
+    """
+    omega = math.pi / swing_time
+
+    def source(t: float) -> tuple:
+        phase = t % period
+        if phase < swing_time:
+            rate = amplitude * omega / 2 * math.sin(omega * phase)
+        elif period / 2 <= phase < period / 2 + swing_time:
+            rate = -amplitude * omega / 2 * math.sin(omega * (phase - period / 2))
+        else:
+            rate = 0.0
+        return (0.0, 0.0, 1.0), (rate + 0.15, -0.1, 0.05), 24.0, (20.0, -5.0, -40.0)
+
+    return source
+
+
+def trace_source(rows: Sequence[tuple], rate: float) -> Callable:
+    """Returns a source that replays recorded ``(accel, gyro, temp, mag)`` rows at ``rate`` Hz"""
+
+    def source(t: float) -> tuple:
+        return rows[int(t * rate) % len(rows)]
+
+    return source
+
+
+def read_trace_csv(path: str) -> list:
+    """Loads a recorded trace for :func:`trace_source`, one sample per line as
+    ``ax, ay, az, gx, gy, gz, temp, mx, my, mz`` in g, degrees/s, degrees C and uT"""
+    rows = []
+    with open(path) as trace:
+        for line in trace:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            values = [float(value) for value in line.split(",")]
+            rows.append((tuple(values[0:3]), tuple(values[3:6]), values[6], tuple(values[7:10])))
+    return rows
+
+
+def _to_int16(value: float) -> int:
+    value = int(round(value))
+    return max(-32768, min(32767, value))
+
+
+class AK09916Model:
+    """Register file of the AK09916 magnetometer behind the ICM20948's I2C master"""
+
+    address = 0x0C
+
+    def __init__(self) -> None:
+        self.registers = bytearray(0x40)
+        self.registers[0x00] = 0x48  # WIA1
+        self.registers[0x01] = 0x09  # WIA2
+
+    def load_field(self, field_ut: Sequence[float]) -> None:
+        for index, value in enumerate(field_ut):
+            raw = _to_int16(value / _MAG_UT_PER_LSB) & 0xFFFF
+            self.registers[0x11 + 2 * index] = raw & 0xFF
+            self.registers[0x12 + 2 * index] = raw >> 8
+        self.registers[0x10] = 0x01 if self.registers[0x31] else 0x00  # ST1 DRDY
+
+    def read(self, register: int) -> int:
+        return self.registers[register & 0x3F]
+
+    def write(self, register: int, value: int) -> None:
+        if register == 0x32 and value & 0x01:  # CNTL3 soft reset
+            self.registers[0x31] = 0
+            return
+        self.registers[register & 0x3F] = value
+
+
+class ICM20948Model:
+    """Register-level model of an ICM20948 for use with :class:`SimulatedI2C`
+
+    :param int address: The I2C address the model answers on
+    :param source: ``source(t)`` returning ``(accel_g, gyro_dps, temp_c, mag_ut)`` in physical
+        units at time ``t`` seconds since the model was created, all along the accel/gyro axes
+    :param clock: Monotonic clock in seconds, defaults to :func:`time.monotonic`
+    """
+
+    def __init__(
+        self,
+        address: int = 0x69,
+        source: Callable = still_source,
+        clock: Callable = time.monotonic,
+    ) -> None:
+        self.address = address
+        self.source = source
+        self.clock = clock
+        self.magnetometer = AK09916Model()
+        self._start = clock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Power-on reset: every bank back to its documented reset value"""
+        self.banks = [bytearray(0x80) for _bank in range(4)]
+        for (bank, register), value in _RESET_VALUES.items():
+            self.banks[bank][register] = value
+        self.bank = 0
+        self.fifo = bytearray()
+        self._last_sample = self._now()
+        self._last_accel = (0, 0, 0)
+
+    # --- helpers ---
+    def _now(self) -> float:
+        return self.clock() - self._start
+
+    @property
+    def gyro_rate(self) -> float:
+        return 1100 / (1 + self.banks[2][_GYRO_SMPLRT_DIV])
+
+    @property
+    def accel_rate(self) -> float:
+        bank2 = self.banks[2]
+        return 1125 / (1 + (bank2[_ACCEL_SMPLRT_DIV_1] << 8 | bank2[_ACCEL_SMPLRT_DIV_2]))
+
+    @property
+    def gyro_enabled(self) -> bool:
+        return not self.banks[0][_PWR_MGMT_2] & 0x07
+
+    @property
+    def sample_rate(self) -> float:
+        """The rate data registers update at, the accel's once it is duty cycled alone"""
+        if self.banks[0][_LP_CONFIG] & 0x20 and not self.gyro_enabled:
+            return self.accel_rate
+        return self.gyro_rate
+
+    def _update(self) -> None:
+        """Latch every sample the sensor has produced since the last bus access"""
+        now = self._now()
+        if self.banks[0][_PWR_MGMT_1] & 0x40:  # asleep
+            self._last_sample = now
+            return
+        period = 1 / self.sample_rate
+        count = int((now - self._last_sample) / period)
+        if count <= 0:
+            return
+        for index in range(max(1, count - _FIFO_SIZE), count + 1):
+            self._latch(self._last_sample + index * period)
+        self._last_sample += count * period
+
+    def _latch(self, t: float) -> None:
+        accel, gyro, temp, mag = self.source(t)
+        if not self.gyro_enabled:
+            gyro = (0.0, 0.0, 0.0)
+        bank0, bank2 = self.banks[0], self.banks[2]
+        gyro_range = (bank2[_GYRO_CONFIG_1] >> 1) & 0x3
+        gyro_lsb = 131.0 / (1 << gyro_range)
+        accel_lsb = 16384.0 / (1 << ((bank2[_ACCEL_CONFIG] >> 1) & 0x3))
+        raw = [_to_int16(value * accel_lsb) for value in accel]
+        for axis, value in enumerate(gyro):
+            # user offsets are 4 counts at the lowest range, added before the data registers
+            high, low = bank2[_XG_OFFS_USRH + 2 * axis : _XG_OFFS_USRH + 2 * axis + 2]
+            offset = (high << 8 | low) - (0x10000 if high & 0x80 else 0)
+            raw.append(_to_int16(value * gyro_lsb + offset * 4 / (1 << gyro_range)))
+        raw.append(_to_int16((temp - _TEMP_OFFSET) * _TEMP_SENSITIVITY))
+        for index, value in enumerate(raw):
+            value &= 0xFFFF
+            bank0[_ACCEL_XOUT_H + 2 * index] = value >> 8
+            bank0[_ACCEL_XOUT_H + 2 * index + 1] = value & 0xFF
+        # the AK09916's Y and Z axes point the opposite way to the accel and gyro axes
+        self.magnetometer.load_field((mag[0], -mag[1], -mag[2]))
+        self._run_slave0()
+        bank0[_INT_STATUS_1] |= 0x01  # RAW_DATA_0_RDY_INT
+        self._wake_on_motion(raw[:3])
+        self._push_fifo()
+
+    def _wake_on_motion(self, accel: Sequence[int]) -> None:
+        bank0, bank2 = self.banks[0], self.banks[2]
+        if bank2[_ACCEL_INTEL_CTRL] & 0x02:
+            # threshold LSB is 4 mg, compare against the previous sample
+            accel_lsb = 16384 >> ((bank2[_ACCEL_CONFIG] >> 1) & 0x3)
+            threshold = bank2[_ACCEL_WOM_THR] * 4 * accel_lsb / 1000
+            if any(abs(a - b) > threshold for a, b in zip(accel, self._last_accel)):
+                bank0[_INT_STATUS] |= 0x08
+        self._last_accel = tuple(accel)
+
+    def _run_slave0(self) -> None:
+        bank0, bank3 = self.banks[0], self.banks[3]
+        ctrl = bank3[_I2C_SLV0_CTRL]
+        if not (ctrl & 0x80 and bank0[_USER_CTRL] & 0x20):
+            return
+        if bank3[_I2C_SLV0_ADDR] & 0x7F != self.magnetometer.address:
+            return
+        start = bank3[_I2C_SLV0_REG]
+        for index in range(ctrl & 0x0F):
+            bank0[_EXT_SLV_SENS_DATA_00 + index] = self.magnetometer.read(start + index)
+
+    def _push_fifo(self) -> None:
+        bank0, bank3 = self.banks[0], self.banks[3]
+        if not bank0[_USER_CTRL] & 0x40:
+            return
+        enables = bank0[_FIFO_EN_2]
+        frame = bytearray()
+        if enables & 0x10:
+            frame += bank0[_ACCEL_XOUT_H : _ACCEL_XOUT_H + 6]
+        for axis in range(3):
+            if enables & (0x02 << axis):
+                frame += bank0[0x33 + 2 * axis : 0x35 + 2 * axis]
+        if enables & 0x01:
+            frame += bank0[0x39:0x3B]
+        if bank0[_FIFO_EN_1] & 0x01:
+            length = bank3[_I2C_SLV0_CTRL] & 0x0F
+            frame += bank0[_EXT_SLV_SENS_DATA_00 : _EXT_SLV_SENS_DATA_00 + length]
+        if len(self.fifo) + len(frame) > _FIFO_SIZE:
+            bank0[_INT_STATUS_2] |= 0x01
+            return
+        self.fifo += frame
+
+    def _run_slave4(self) -> None:
+        bank3 = self.banks[3]
+        address = bank3[_I2C_SLV4_ADDR]
+        if address & 0x7F == self.magnetometer.address:
+            register = bank3[_I2C_SLV4_REG]
+            if address & 0x80:
+                bank3[_I2C_SLV4_DI] = self.magnetometer.read(register)
+            else:
+                self.magnetometer.write(register, bank3[_I2C_SLV4_DO])
+            self.banks[0][_I2C_MST_STATUS] |= 0x40  # I2C_SLV4_DONE
+        else:
+            self.banks[0][_I2C_MST_STATUS] |= 0x10  # I2C_SLV4_NACK
+        bank3[_I2C_SLV4_CTRL] &= 0x7F
+
+    # --- bus interface ---
+    def read(self, register: int, length: int) -> bytes:
+        """Auto-incrementing read of ``length`` bytes starting at ``register``"""
+        self._update()
+        out = bytearray()
+        bank = self.banks[self.bank]
+        for _i in range(length):
+            if register == _REG_BANK_SEL:
+                out.append(self.bank << 4)
+            elif self.bank == 0 and register == _FIFO_R_W:
+                out.append(self.fifo.pop(0) if self.fifo else 0xFF)
+                continue  # the FIFO port does not auto-increment
+            elif self.bank == 0 and register == _FIFO_COUNTH:
+                out.append((len(self.fifo) >> 8) & 0x1F)
+            elif self.bank == 0 and register == _FIFO_COUNTL:
+                out.append(len(self.fifo) & 0xFF)
+            else:
+                out.append(bank[register])
+                if self.bank == 0 and register in (
+                    _I2C_MST_STATUS,
+                    _INT_STATUS,
+                    _INT_STATUS_1,
+                    _INT_STATUS_2,
+                    _INT_STATUS_3,
+                ):
+                    bank[register] = 0  # status registers clear on read
+            register = (register + 1) & 0x7F
+        return bytes(out)
+
+    def write(self, register: int, data: bytes) -> None:
+        """Auto-incrementing write of ``data`` starting at ``register``"""
+        self._update()
+        for value in data:
+            if register == _REG_BANK_SEL:
+                self.bank = (value >> 4) & 0x3
+            elif self.bank == 0 and register == _PWR_MGMT_1 and value & 0x80:
+                self.reset()
+                return
+            elif self.bank == 0 and register == _FIFO_RST and value & 0x1F:
+                self.fifo = bytearray()
+            elif self.bank == 0 and register == _USER_CTRL and value & 0x02:
+                self.banks[0][register] = value & ~0x02  # I2C_MST_RST self-clears
+            elif self.bank == 0 and register in (_WHO_AM_I, _FIFO_COUNTH, _FIFO_COUNTL):
+                pass  # read only
+            else:
+                self.banks[self.bank][register] = value
+                if self.bank == 3 and register == _I2C_SLV4_CTRL and value & 0x80:
+                    self._run_slave4()
+            register = (register + 1) & 0x7F
+
+
+class SimulatedI2C:
+    """A ``busio.I2C`` stand-in that routes transactions to register models
+
+    Each transaction is counted and costed at ``frequency`` Hz: nine clocks per byte
+    (address byte included) plus start/stop overhead.
+
+    :param devices: Models to attach, each with an ``address`` attribute
+    :param int frequency: The simulated SCL frequency
+    """
+
+    def __init__(self, *devices: Any, frequency: int = 400000) -> None:
+        self.frequency = frequency
+        self.devices = {}
+        for device in devices:
+            self.attach(device)
+        self._locked = False
+        self.reset_counters()
+
+    def attach(self, device: Any) -> None:
+        self.devices[device.address] = device
+
+    def reset_counters(self) -> None:
+        """Zero the transaction counters and the simulated bus time"""
+        self.transactions = 0
+        self.reads = 0
+        self.writes = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.bus_time = 0.0
+
+    @property
+    def counters(self) -> dict:
+        return {
+            "transactions": self.transactions,
+            "reads": self.reads,
+            "writes": self.writes,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "bus_time": self.bus_time,
+        }
+
+    def _cost(self, written: int, read: int) -> None:
+        clocks = 2  # start + stop
+        if written:
+            clocks += 9 * (1 + written)
+        if read:
+            clocks += 9 * (1 + read) + (1 if written else 0)  # repeated start
+        self.transactions += 1
+        self.bytes_written += written
+        self.bytes_read += read
+        self.bus_time += clocks / self.frequency
+
+    def _device(self, address: int) -> Any:
+        try:
+            return self.devices[address]
+        except KeyError:
+            raise OSError(19, "No I2C device at address: 0x%x" % address) from None
+
+    # --- busio.I2C API ---
+    def try_lock(self) -> bool:
+        if self._locked:
+            return False
+        self._locked = True
+        return True
+
+    def unlock(self) -> None:
+        self._locked = False
+
+    def scan(self) -> list:
+        return sorted(self.devices)
+
+    def deinit(self) -> None:
+        pass
+
+    def __enter__(self) -> SimulatedI2C:
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.deinit()
+
+    def writeto(
+        self, address: int, buffer: bytes, *, start: int = 0, end: int | None = None
+    ) -> None:
+        device = self._device(address)
+        data = bytes(buffer[start:end])
+        self.writes += 1
+        self._cost(max(len(data), 0), 0)
+        if len(data) > 1:
+            device.write(data[0], data[1:])
+        elif data:
+            device.pointer = data[0]
+
+    def readfrom_into(
+        self, address: int, buffer: bytearray, *, start: int = 0, end: int | None = None
+    ) -> None:
+        device = self._device(address)
+        end = len(buffer) if end is None else end
+        data = device.read(getattr(device, "pointer", 0), end - start)
+        buffer[start:end] = data
+        self.reads += 1
+        self._cost(0, end - start)
+
+    def writeto_then_readfrom(
+        self,
+        address: int,
+        out_buffer: bytes,
+        in_buffer: bytearray,
+        *,
+        out_start: int = 0,
+        out_end: int | None = None,
+        in_start: int = 0,
+        in_end: int | None = None,
+    ) -> None:
+        device = self._device(address)
+        out = bytes(out_buffer[out_start:out_end])
+        in_end = len(in_buffer) if in_end is None else in_end
+        in_buffer[in_start:in_end] = device.read(out[0], in_end - in_start)
+        self.reads += 1
+        self._cost(len(out), in_end - in_start)